@@ -43,6 +43,7 @@ def create_app(config_class=None):
     from app.api.geography import geography_bp
     from app.api.reports import reports_bp
     from app.api.public import public_bp
+    from app.api.jobs import jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(subscriptions_bp, url_prefix='/api/subscriptions')
@@ -50,6 +51,7 @@ def create_app(config_class=None):
     app.register_blueprint(geography_bp, url_prefix='/api/geographic')
     app.register_blueprint(reports_bp, url_prefix='/api/reports')
     app.register_blueprint(public_bp, url_prefix='/api/public')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
     
     # Register error handlers
     register_error_handlers(app)
@@ -95,19 +97,27 @@ def register_error_handlers(app):
     @app.errorhandler(400)
     def bad_request(error):
         return jsonify({'message': 'Bad request'}), 400
-
+    
     @app.errorhandler(401)
     def unauthorized(error):
         return jsonify({'message': 'Unauthorized access'}), 401
-
+    
     @app.errorhandler(403)
     def forbidden(error):
         return jsonify({'message': 'Forbidden access'}), 403
-
+    
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'message': 'Resource not found'}), 404
-
+    
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        response = jsonify({'message': 'Too many requests, please try again later'})
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({'message': 'Internal server error'}), 500
@@ -119,11 +129,20 @@ def register_jwt_handlers(jwt):
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
         return jsonify({'message': 'Token has expired'}), 401
-
+    
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
         return jsonify({'message': 'Invalid token'}), 401
-
+    
     @jwt.unauthorized_loader
     def missing_token_callback(error):
-        return jsonify({'message': 'Authorization token required'}), 401
\ No newline at end of file
+        return jsonify({'message': 'Authorization token required'}), 401
+    
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        from app.auth.revocation import revocation_list
+        return revocation_list.is_revoked(jwt_payload['jti'])
+    
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'message': 'Token has been revoked'}), 401
\ No newline at end of file
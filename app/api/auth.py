@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, create_access_token, decode_token
 from flasgger import swag_from
 from app.models import User
 from app.auth.decorators import admin_required, create_tokens
+from app.auth.roles import get_user_role
+from app.auth.revocation import revocation_list
 from app.docs.swagger_specs import (
     auth_login_spec, auth_register_spec
 )
@@ -32,7 +34,7 @@ def login():
     if not user:
         return jsonify({'message': 'Invalid credentials'}), 401
     
-    access_token, refresh_token = create_tokens(user['user_id'])
+    access_token, refresh_token = create_tokens(user['user_id'], user['role'])
     
     # Store token in Redis with user_id as key
     redis_client = get_redis_client()
@@ -115,7 +117,10 @@ def register():
 def refresh():
     """Refresh access token"""
     current_user_id = get_jwt_identity()
-    access_token = create_access_token(identity=current_user_id)
+    role = get_user_role(current_user_id)
+    if role is None:
+        return jsonify({'message': 'User not found'}), 401
+    access_token = create_access_token(identity=current_user_id, additional_claims={'role': role})
     
     # Update token in Redis
     redis_client = get_redis_client()
@@ -127,8 +132,21 @@ def refresh():
 @swag_from({
     "tags": ["Authentication"],
     "summary": "User logout",
-    "description": "Logout user by invalidating the current session token.",
+    "description": "Logout user by revoking the current access token, and the refresh token if one is given. Revoked tokens are rejected until they expire.",
     "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "body",
+            "in": "body",
+            "required": False,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "refresh_token": {"type": "string", "description": "Refresh token to revoke as well"}
+                }
+            }
+        }
+    ],
     "responses": {
         "200": {
             "description": "Logged out successfully",
@@ -139,16 +157,38 @@ def refresh():
                 }
             }
         },
+        "400": {
+            "description": "Invalid refresh token",
+            "schema": {"$ref": "#/definitions/Error"}
+        },
         "401": {
             "description": "Unauthorized - Invalid token",
             "schema": {"$ref": "#/definitions/Error"}
+        },
+        "503": {
+            "description": "Token could not be revoked because Redis is unavailable",
+            "schema": {"$ref": "#/definitions/Error"}
         }
     }
 })
 @jwt_required()
 def logout():
-    """User logout - remove token from Redis"""
+    """User logout - revoke the token and remove it from Redis"""
     current_user_id = get_jwt_identity()
+    tokens = [get_jwt()]
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('refresh_token'):
+        try:
+            refresh_token = decode_token(data['refresh_token'])
+        except Exception:
+            return jsonify({'message': 'Invalid refresh token'}), 400
+        if refresh_token.get('sub') == current_user_id:
+            tokens.append(refresh_token)
+    
+    for token in tokens:
+        if not revocation_list.revoke(token['jti'], token['exp']):
+            return jsonify({'message': 'Logout is temporarily unavailable, please try again'}), 503
     
     # Remove token from Redis
     redis_client = get_redis_client()
@@ -0,0 +1,56 @@
+from flask import Blueprint, jsonify, current_app, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.jobs import get_job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get background job status, progress and result summary"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    response = {
+        'job_id': job['job_id'],
+        'type': job['type'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'total': job.get('total'),
+        'result': job.get('result'),
+        'error': job.get('error'),
+        'created_at': job.get('created_at'),
+        'started_at': job.get('started_at'),
+        'finished_at': job.get('finished_at')
+    }
+    if job.get('artifact_id'):
+        response['result_url'] = url_for('jobs.download_job_result', job_id=job_id)
+    
+    return jsonify(response), 200
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+@jwt_required()
+def download_job_result(job_id):
+    """Download the file produced by a finished job"""
+    job = _get_own_job(job_id)
+    if job is None or not job.get('artifact_id'):
+        return jsonify({'message': 'Job result not found'}), 404
+    
+    artifact = get_job_queue(current_app).open_file(job['artifact_id'])
+    if artifact is None:
+        return jsonify({'message': 'Job result has expired'}), 404
+    
+    return send_file(
+        artifact,
+        mimetype=job['artifact_mimetype'],
+        as_attachment=True,
+        download_name=job['artifact_filename']
+    )
+
+def _get_own_job(job_id):
+    """Load a job if it belongs to the current user"""
+    job = get_job_queue(current_app).get(job_id)
+    if job is None or job.get('user_id') != get_jwt_identity():
+        return None
+    return job
@@ -1,12 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.models import Subscription, Package
+from app.models.subscription import parse_fields, PUBLIC_FIELDS
 from app.models.geography import get_kigali_districts, get_sectors_by_district, get_cells_by_sector
 from datetime import datetime
 from app.models.user import User
+from app.utils.cache import cached_response
+from app.utils.rate_limit import rate_limit
+from app.utils.idempotency import idempotent
 public_bp = Blueprint('public', __name__)
 
 # JSON export endpoints for all tables (must be after public_bp definition)
 @public_bp.route('/users.json', methods=['GET'])
+@rate_limit(per_ip='PUBLIC_EXPORT_LIMIT_PER_IP', per_route='PUBLIC_EXPORT_LIMIT')
 def export_users_json():
     """Export all users as JSON (public, for browser download)"""
     user_model = User(current_app.db.db)
@@ -21,10 +26,14 @@ def export_packages_json():
     return jsonify(packages), 200
 
 @public_bp.route('/subscriptions.json', methods=['GET'])
+@rate_limit(per_ip='PUBLIC_EXPORT_LIMIT_PER_IP', per_route='PUBLIC_EXPORT_LIMIT')
 def export_subscriptions_json():
     """Export all subscriptions as JSON (public, for browser download)"""
     subscription_model = Subscription(current_app.db.db)
-    result = subscription_model.get_all_subscriptions(filters=None, page=1, per_page=10000)
+    # Unauthenticated callers only ever see non-identifying fields
+    result = subscription_model.get_all_subscriptions(
+        filters=None, page=1, per_page=10000, with_total='false', fields=PUBLIC_FIELDS
+    )
     return jsonify(result['subscriptions']), 200
 
 # Package routes
@@ -60,6 +69,8 @@ def get_public_cells(district, sector):
 
 # Subscription routes
 @public_bp.route('/subscriptions', methods=['POST'])
+@rate_limit(per_ip='PUBLIC_SUBSCRIBE_LIMIT_PER_IP', per_route='PUBLIC_SUBSCRIBE_LIMIT')
+@idempotent
 def public_create_subscription():
     """Create new subscription (public, no authentication)"""
     data = request.get_json()
@@ -104,11 +115,25 @@ def get_public_subscriptions():
     
     filters = {'is_active': True}
     
+    # Unauthenticated callers only ever see non-identifying fields
+    fields, error = parse_fields(request.args.get('fields'), allowed=PUBLIC_FIELDS)
+    if error:
+        return jsonify({'message': error}), 400
+    
     subscription_model = Subscription(current_app.db.db)
-    result = subscription_model.get_all_subscriptions(filters, page, per_page)
+    result = subscription_model.get_all_subscriptions(
+        filters, page, per_page, cursor=request.args.get('cursor'),
+        with_total=request.args.get('with_total', 'estimate').lower(),
+        fields=fields
+    )
+    
+    if 'error' in result:
+        return jsonify({'message': result['error']}), 400
+    
     return jsonify(result), 200
 
 @public_bp.route('/subscriptions/stats', methods=['GET'])
+@cached_response()
 def get_public_subscription_stats():
     """Get basic subscription statistics (public)"""
     subscription_model = Subscription(current_app.db.db)
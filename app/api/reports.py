@@ -1,12 +1,38 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required
-from app.models import Subscription
+from app.models import Subscription, Package, DailyStats
+from app.models.geography import build_geo_tree
+from app.models.daily_stats import REPORT_TIMEZONE, TREND_FORMATS, iter_periods, period_start
+from app.auth.decorators import admin_required
+from app.utils.cache import cached, cached_response, cache_stats
+from app.utils.events import hub
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import json
+import queue
+import time
 
 reports_bp = Blueprint('reports', __name__)
 
+# Default /trends window ending today, per granularity
+TREND_DEFAULT_SPANS = {
+    'day': timedelta(days=29),
+    'week': timedelta(weeks=11),
+    'month': timedelta(days=335)
+}
+
+# Upper bound on the number of periods one /trends request may return
+MAX_TREND_PERIODS = 400
+
+# Longest renewal forecast horizon, in days
+MAX_FORECAST_DAYS = 365
+
+# Most monthly cohorts one /cohorts request may return
+MAX_COHORT_MONTHS = 36
+
 @reports_bp.route('/subscription-summary', methods=['GET'])
 @jwt_required()
+@cached_response()
 def subscription_analytics():
     """Get subscription analytics"""
     subscription_model = Subscription(current_app.db.db)
@@ -15,6 +41,7 @@ def subscription_analytics():
 
 @reports_bp.route('/upcoming-renewals', methods=['GET'])
 @jwt_required()
+@cached_response()
 def upcoming_renewals():
     """Get subscriptions due for renewal in next 7 days"""
     from flask import request
@@ -29,101 +56,201 @@ def upcoming_renewals():
         'days_ahead': days_ahead
     }), 200
 
+@reports_bp.route('/renewal-forecast', methods=['GET'])
+@jwt_required()
+@cached_response()
+def renewal_forecast():
+    """Get per-day renewals due over the next N days (default 90), by area and package, with revenue at stake"""
+    from flask import request
+    
+    days = int(request.args.get('days', 90))
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        return jsonify({'message': f'days must be between 1 and {MAX_FORECAST_DAYS}'}), 400
+    
+    today = datetime.now(ZoneInfo(REPORT_TIMEZONE)).date()
+    start = datetime(today.year, today.month, today.day)
+    
+    prices = Package(current_app.db.db).get_price_map()
+    forecast = Subscription(current_app.db.db).get_renewal_forecast(start, days, prices)
+    forecast['days'] = days
+    
+    return jsonify(forecast), 200
+
+@reports_bp.route('/cohorts', methods=['GET'])
+@jwt_required()
+def cohorts():
+    """Get the monthly cohort retention matrix
+    
+    Query params: months (number of cohorts, default 12), area, package.
+    Cached per day for each parameter combination.
+    """
+    from flask import request
+    
+    months = int(request.args.get('months', 12))
+    if not 1 <= months <= MAX_COHORT_MONTHS:
+        return jsonify({'message': f'months must be between 1 and {MAX_COHORT_MONTHS}'}), 400
+    
+    filters = {}
+    for field in ('area', 'package'):
+        if request.args.get(field):
+            filters[field] = request.args.get(field)
+    
+    today = datetime.now(ZoneInfo(REPORT_TIMEZONE)).date()
+    first_month = today.replace(day=1)
+    for _ in range(months - 1):
+        first_month = (first_month - timedelta(days=1)).replace(day=1)
+    
+    def compute():
+        result = Subscription(current_app.db.db).get_cohort_retention(first_month, today, filters)
+        result.update({'as_of': today.isoformat(), 'filters': filters})
+        return result
+    
+    key = f"cohorts:{today.isoformat()}:{months}:{filters.get('area', '')}:{filters.get('package', '')}"
+    result = cached(key, current_app.config.get('COHORT_CACHE_SECONDS', 0), compute, versioned=False)
+    return jsonify(result), 200
+
+@reports_bp.route('/revenue', methods=['GET'])
+@jwt_required()
+@cached_response()
+def revenue():
+    """Get monthly revenue by package and area, split into paid, pending and failed
+    
+    Query params: from and to (YYYY-MM, default the last 12 months).
+    Revenue is agreed subscriptions times the current package price.
+    """
+    from flask import request
+    
+    today = datetime.now(ZoneInfo(REPORT_TIMEZONE)).date()
+    try:
+        end_month = datetime.strptime(request.args['to'], '%Y-%m').date() if request.args.get('to') else today.replace(day=1)
+        if request.args.get('from'):
+            start_month = datetime.strptime(request.args['from'], '%Y-%m').date()
+        else:
+            start_month = end_month
+            for _ in range(11):
+                start_month = (start_month - timedelta(days=1)).replace(day=1)
+    except ValueError:
+        return jsonify({'message': 'Invalid month format. Use YYYY-MM'}), 400
+    
+    if start_month > end_month:
+        return jsonify({'message': '"from" must not be after "to"'}), 400
+    
+    # Last day of the `to` month
+    end = (end_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    
+    prices = Package(current_app.db.db).get_price_map()
+    rows = DailyStats(current_app.db.db).revenue(prices, start_month, end)
+    
+    def bucket(**labels):
+        return {**labels, 'subscriptions': 0, 'paid': 0, 'pending': 0, 'failed': 0, 'total': 0}
+    
+    def add(target, row):
+        target['subscriptions'] += row['subscriptions']
+        target['total'] += row['revenue']
+        status = (row['payment_status'] or 'Pending').lower()
+        target[status] = target.get(status, 0) + row['revenue']
+    
+    totals = bucket()
+    months = {}
+    for row in rows:
+        month = months.setdefault(row['month'], {**bucket(month=row['month']), 'by_package': {}, 'by_area': {}})
+        add(totals, row)
+        add(month, row)
+        add(month['by_package'].setdefault(row['package'], bucket(package=row['package'])), row)
+        add(month['by_area'].setdefault(row['area'], bucket(area=row['area'])), row)
+    
+    for month in months.values():
+        month['by_package'] = sorted(month['by_package'].values(), key=lambda item: item['total'], reverse=True)
+        month['by_area'] = sorted(month['by_area'].values(), key=lambda item: item['total'], reverse=True)
+    
+    return jsonify({
+        'from': start_month.strftime('%Y-%m'),
+        'to': end_month.strftime('%Y-%m'),
+        'prices': prices,
+        'totals': totals,
+        'months': [months[key] for key in sorted(months)]
+    }), 200
+
 @reports_bp.route('/dashboard-stats', methods=['GET'])
 @jwt_required()
+@cached_response('DASHBOARD_CACHE_SECONDS')
 def dashboard_stats():
     """Get dashboard statistics"""
     subscription_model = Subscription(current_app.db.db)
+    return jsonify(subscription_model.get_dashboard_stats()), 200
+
+@reports_bp.route('/live', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def live_dashboard():
+    """Stream dashboard counters as Server-Sent Events
     
-    # Basic counts
-    total_active = subscription_model.collection.count_documents({"is_active": True})
-    total_agreed = subscription_model.collection.count_documents({
-        "is_active": True, 
-        "agreed_refused": "Agreed"
-    })
-    total_refused = subscription_model.collection.count_documents({
-        "is_active": True, 
-        "agreed_refused": "Refused"
-    })
-    
-    # This month's subscriptions
-    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    this_month = subscription_model.collection.count_documents({
-        "is_active": True,
-        "date_of_subscription": {"$gte": start_of_month}
-    })
-    
-    # Upcoming renewals (next 7 days)
-    upcoming_renewals = subscription_model.collection.count_documents({
-        "is_active": True,
-        "renew_subscription_by": {
-            "$lte": datetime.utcnow() + timedelta(days=7)
-        },
-        "agreed_refused": "Agreed"
-    })
-    
-    # Payment status breakdown
-    paid_count = subscription_model.collection.count_documents({
-        "is_active": True,
-        "payment_status": "Paid"
-    })
-    pending_count = subscription_model.collection.count_documents({
-        "is_active": True,
-        "payment_status": "Pending"
-    })
-    failed_count = subscription_model.collection.count_documents({
-        "is_active": True,
-        "payment_status": "Failed"
-    })
+    Sends a `snapshot` event with the dashboard-stats counters, then a
+    `counters` event with the changes of every subscription write, taken
+    from Redis pub/sub instead of polling Mongo. The snapshot is resent
+    periodically and whenever the client fell behind. EventSource cannot
+    set headers, so the token may also be passed as ?jwt=<access_token>.
+    """
+    heartbeat = current_app.config.get('LIVE_HEARTBEAT_SECONDS', 15)
+    snapshot_interval = current_app.config.get('LIVE_SNAPSHOT_SECONDS', 300)
     
-    return jsonify({
-        'total_subscriptions': total_active,
-        'total_agreed': total_agreed,
-        'total_refused': total_refused,
-        'success_rate': round((total_agreed / total_active * 100), 2) if total_active > 0 else 0,
-        'this_month_subscriptions': this_month,
-        'upcoming_renewals': upcoming_renewals,
-        'payment_breakdown': {
-            'paid': paid_count,
-            'pending': pending_count,
-            'failed': failed_count
-        }
-    }), 200
+    def snapshot():
+        # Queued changes are part of the snapshot; sending them too would count them twice
+        listener.clear()
+        subscription_model = Subscription(current_app.db.db)
+        stats = cached(
+            'live:dashboard-stats',
+            current_app.config.get('DASHBOARD_CACHE_SECONDS', 30),
+            subscription_model.get_dashboard_stats
+        )
+        return f'event: snapshot\ndata: {json.dumps(stats)}\n\n'
+    
+    listener = hub.listen(current_app.config['SESSION_REDIS'])
+    
+    def stream():
+        try:
+            yield snapshot()
+            last_snapshot = time.monotonic()
+            while True:
+                try:
+                    message = json.loads(listener.get(timeout=heartbeat))
+                except queue.Empty:
+                    message = None
+                
+                if listener.overflowed or time.monotonic() - last_snapshot >= snapshot_interval:
+                    yield snapshot()
+                    last_snapshot = time.monotonic()
+                elif message is not None:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+                else:
+                    yield ': keepalive\n\n'
+        finally:
+            hub.unlisten(listener)
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @reports_bp.route('/monthly-trends', methods=['GET'])
 @jwt_required()
+@cached_response()
 def monthly_trends():
     """Get monthly subscription trends"""
     from flask import request
     
     months_back = int(request.args.get('months', 12))
-    subscription_model = Subscription(current_app.db.db)
     
-    pipeline = [
-        {"$match": {"is_active": True}},
-        {"$group": {
-            "_id": {
-                "year": {"$year": "$date_of_subscription"},
-                "month": {"$month": "$date_of_subscription"}
-            },
-            "total": {"$sum": 1},
-            "agreed": {
-                "$sum": {"$cond": [{"$eq": ["$agreed_refused", "Agreed"]}, 1, 0]}
-            }
-        }},
-        {"$sort": {"_id.year": -1, "_id.month": -1}},
-        {"$limit": months_back}
-    ]
-    
-    trends = list(subscription_model.collection.aggregate(pipeline))
+    # The latest months that have subscriptions, newest first
+    trends = DailyStats(current_app.db.db).latest_periods('month', max(months_back, 1))
     
     # Format the response
     formatted_trends = []
     for trend in trends:
         formatted_trends.append({
-            'year': trend['_id']['year'],
-            'month': trend['_id']['month'],
-            'month_name': datetime(trend['_id']['year'], trend['_id']['month'], 1).strftime('%B'),
+            'year': trend['period'].year,
+            'month': trend['period'].month,
+            'month_name': trend['period'].strftime('%B'),
             'total_subscriptions': trend['total'],
             'agreed_subscriptions': trend['agreed'],
             'success_rate': round((trend['agreed'] / trend['total'] * 100), 2) if trend['total'] > 0 else 0
@@ -134,25 +261,59 @@ def monthly_trends():
         'months_requested': months_back
     }), 200
 
+@reports_bp.route('/trends', methods=['GET'])
+@jwt_required()
+@cached_response()
+def trends():
+    """Get subscription trends per day, week or month
+    
+    Query params: granularity (day|week|month, default day), from and to
+    (YYYY-MM-DD, Africa/Kigali calendar days). Defaults to the last 30
+    days, 12 weeks or 12 months up to today.
+    """
+    from flask import request
+    
+    granularity = request.args.get('granularity', 'day').lower()
+    if granularity not in TREND_FORMATS:
+        return jsonify({'message': f'Invalid granularity. Use one of: {list(TREND_FORMATS)}'}), 400
+    
+    try:
+        end = (datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to')
+               else datetime.now(ZoneInfo(REPORT_TIMEZONE)).date())
+        start = (datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from')
+                 else period_start(end - TREND_DEFAULT_SPANS[granularity], granularity))
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if start > end:
+        return jsonify({'message': '"from" must not be after "to"'}), 400
+    if sum(1 for _ in iter_periods(start, end, granularity)) > MAX_TREND_PERIODS:
+        return jsonify({'message': f'Date range too large, at most {MAX_TREND_PERIODS} {granularity}s'}), 400
+    
+    trends = DailyStats(current_app.db.db).trends(granularity, start, end)
+    
+    return jsonify({
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'timezone': REPORT_TIMEZONE,
+        'trends': [
+            {
+                'period_start': trend['period'].isoformat(),
+                'total_subscriptions': trend['total'],
+                'agreed_subscriptions': trend['agreed'],
+                'success_rate': round((trend['agreed'] / trend['total'] * 100), 2) if trend['total'] > 0 else 0
+            }
+            for trend in trends
+        ]
+    }), 200
+
 @reports_bp.route('/area-distribution', methods=['GET'])
 @jwt_required()
+@cached_response()
 def area_distribution():
     """Get subscription distribution by area"""
-    subscription_model = Subscription(current_app.db.db)
-    
-    pipeline = [
-        {"$match": {"is_active": True}},
-        {"$group": {
-            "_id": "$area",
-            "total": {"$sum": 1},
-            "agreed": {
-                "$sum": {"$cond": [{"$eq": ["$agreed_refused", "Agreed"]}, 1, 0]}
-            }
-        }},
-        {"$sort": {"total": -1}}
-    ]
-    
-    distribution = list(subscription_model.collection.aggregate(pipeline))
+    distribution = DailyStats(current_app.db.db).area_distribution()
     
     # Format the response
     formatted_distribution = []
@@ -168,26 +329,30 @@ def area_distribution():
         'area_distribution': formatted_distribution
     }), 200
 
+@reports_bp.route('/geo-distribution', methods=['GET'])
+@jwt_required()
+@cached_response()
+def geo_distribution():
+    """Get subscription totals for the whole district -> sector -> cell tree"""
+    counts = Subscription(current_app.db.db).get_geo_distribution()
+    return jsonify({'districts': build_geo_tree(counts)}), 200
+
 @reports_bp.route('/package-popularity', methods=['GET'])
 @jwt_required()
+@cached_response()
 def package_popularity():
     """Get package popularity statistics"""
-    subscription_model = Subscription(current_app.db.db)
-    
-    pipeline = [
-        {"$match": {"is_active": True, "agreed_refused": "Agreed"}},
-        {"$group": {
-            "_id": "$package",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}}
-    ]
-    
-    popularity = list(subscription_model.collection.aggregate(pipeline))
+    popularity = DailyStats(current_app.db.db).package_popularity()
     
     return jsonify({
         'package_popularity': [
             {'package': item['_id'], 'subscription_count': item['count']}
             for item in popularity
         ]
-    }), 200
\ No newline at end of file
+    }), 200
+
+@reports_bp.route('/cache-stats', methods=['GET'])
+@admin_required
+def report_cache_stats():
+    """Get report cache hit/miss counters"""
+    return jsonify(cache_stats()), 200
@@ -1,18 +1,27 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, request, jsonify, current_app, Response, send_file, stream_with_context, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from flasgger import swag_from
-from app.models import Subscription
+from app.models import Subscription, Package
+from app.models.subscription import parse_fields
 from app.auth.decorators import admin_required
+from app.utils.export import EXPORT_FIELDS, EXPORT_FORMATS, RAW_FORMATS, STREAM_GENERATORS, write_xlsx
+from app.jobs import get_job_queue
+from app.utils.imports import IMPORT_FORMATS, READ_ERRORS, detect_import_format, read_rows
+from app.utils.idempotency import idempotent
+from openpyxl.utils.exceptions import InvalidFileException
 from app.docs.swagger_specs import (
     subscription_create_spec, subscription_list_spec, subscription_search_spec
 )
 from datetime import datetime
+import shutil
+import tempfile
 
 subscriptions_bp = Blueprint('subscriptions', __name__)
 
 @subscriptions_bp.route('', methods=['POST'])
 @swag_from(subscription_create_spec)
 @jwt_required()
+@idempotent
 def create_subscription():
     """
     Create new subscription
@@ -76,8 +85,20 @@ def get_subscriptions():
     
     filters['is_active'] = True
     
+    fields, error = parse_fields(request.args.get('fields'))
+    if error:
+        return jsonify({'message': error}), 400
+    
     subscription_model = Subscription(current_app.db.db)
-    result = subscription_model.get_all_subscriptions(filters, page, per_page)
+    result = subscription_model.get_all_subscriptions(
+        filters, page, per_page, cursor=request.args.get('cursor'),
+        with_total=request.args.get('with_total', 'estimate').lower(),
+        fields=fields
+    )
+    
+    if 'error' in result:
+        return jsonify({'message': result['error']}), 400
+    
     return jsonify(result), 200
 
 @subscriptions_bp.route('/<subscription_id>', methods=['GET'])
@@ -93,6 +114,12 @@ def get_subscriptions():
             "required": True,
             "type": "string",
             "description": "Unique subscription identifier"
+        },
+        {
+            "name": "fields",
+            "in": "query",
+            "type": "string",
+            "description": "Comma separated list of fields to return, e.g. child_name,phone_number,area,renew_subscription_by"
         }
     ],
     "responses": {
@@ -118,8 +145,12 @@ def get_subscriptions():
 @jwt_required()
 def get_subscription(subscription_id):
     """Get subscription by ID"""
+    fields, error = parse_fields(request.args.get('fields'))
+    if error:
+        return jsonify({'message': error}), 400
+    
     subscription_model = Subscription(current_app.db.db)
-    subscription = subscription_model.get_subscription_by_id(subscription_id)
+    subscription = subscription_model.get_subscription_by_id(subscription_id, fields)
     
     if not subscription:
         return jsonify({'message': 'Subscription not found'}), 404
@@ -292,9 +323,16 @@ def delete_subscription(subscription_id):
 @swag_from({
     "tags": ["Subscriptions"],
     "summary": "Bulk update subscriptions (Admin only)",
-    "description": "Update multiple subscriptions at once. Useful for batch operations like payment status updates.",
+    "description": "Update multiple subscriptions at once. Useful for batch operations like payment status updates. The update is validated once and written in batched update_many/bulk_write calls, so tens of thousands of IDs fit in one request.",
     "security": [{"Bearer": []}],
     "parameters": [
+        {
+            "name": "async",
+            "in": "query",
+            "type": "boolean",
+            "default": False,
+            "description": "Run as a background job and return 202 with a job_id to poll at /api/jobs/{job_id}"
+        },
         {
             "name": "bulk_data",
             "in": "body",
@@ -354,6 +392,17 @@ def delete_subscription(subscription_id):
                 }
             }
         },
+        "202": {
+            "description": "Queued as a background job (async=true)",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string"},
+                    "job_id": {"type": "string"},
+                    "status_url": {"type": "string"}
+                }
+            }
+        },
         "400": {
             "description": "Bad request - Invalid data",
             "schema": {"$ref": "#/definitions/Error"}
@@ -378,21 +427,134 @@ def bulk_update_subscriptions():
     if not isinstance(subscription_ids, list) or not subscription_ids:
         return jsonify({'message': 'subscription_ids must be a non-empty list'}), 400
     
-    subscription_model = Subscription(current_app.db.db)
-    results = []
+    if not isinstance(update_data, dict):
+        return jsonify({'message': 'update_data must be an object'}), 400
     
-    for subscription_id in subscription_ids:
-        result = subscription_model.update_subscription(subscription_id, update_data)
-        results.append({
-            'subscription_id': subscription_id,
-            'result': result
+    if _run_async():
+        return _queue_job('bulk_update_subscriptions', {
+            'subscription_ids': subscription_ids,
+            'update_data': update_data
         })
     
+    subscription_model = Subscription(current_app.db.db)
+    result = subscription_model.bulk_update_subscriptions(subscription_ids, update_data)
+    
+    if 'error' in result:
+        return jsonify({'message': result['error']}), 400
+    
     return jsonify({
         'message': f'Bulk update completed for {len(subscription_ids)} subscriptions',
-        'results': results
+        'results': result['results']
     }), 200
 
+@subscriptions_bp.route('/import', methods=['POST'])
+@swag_from({
+    "tags": ["Subscriptions"],
+    "summary": "Bulk import subscriptions",
+    "description": "Import subscriptions from a CSV, NDJSON or XLSX upload. Rows are read as a stream, validated in batches against the Kigali geography and the active package catalog, and inserted with unordered insert_many batches. Column headers may be field names (phone_number) or export headers (Phone Number). If the file turns out to be corrupt partway through, the rows read so far are imported and a final error row says where reading stopped.",
+    "security": [{"Bearer": []}],
+    "consumes": ["multipart/form-data", "text/csv", "application/x-ndjson"],
+    "parameters": [
+        {
+            "name": "async",
+            "in": "query",
+            "type": "boolean",
+            "default": False,
+            "description": "Run as a background job and return 202 with a job_id to poll at /api/jobs/{job_id}"
+        },
+        {
+            "name": "file",
+            "in": "formData",
+            "type": "file",
+            "description": "Upload file. Alternatively send the file as the raw request body"
+        },
+        {
+            "name": "format",
+            "in": "query",
+            "type": "string",
+            "enum": ["csv", "ndjson", "xlsx"],
+            "description": "Upload format, detected from the file name or content type when omitted"
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Import finished, see errors for rejected rows",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "total_rows": {"type": "integer"},
+                    "inserted": {"type": "integer"},
+                    "failed": {"type": "integer"},
+                    "errors": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "row": {"type": "integer"},
+                                "error": {"type": "string"}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        "202": {
+            "description": "Queued as a background job (async=true)",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string"},
+                    "job_id": {"type": "string"},
+                    "status_url": {"type": "string"}
+                }
+            }
+        },
+        "400": {
+            "description": "Bad request - Missing upload or unknown format",
+            "schema": {"$ref": "#/definitions/Error"}
+        }
+    }
+})
+@jwt_required()
+def import_subscriptions():
+    """Bulk import subscriptions from an uploaded file"""
+    upload = request.files.get('file')
+    if upload:
+        stream, filename = upload.stream, upload.filename
+    elif request.content_length:
+        stream, filename = request.stream, ''
+    else:
+        return jsonify({'message': 'No file uploaded'}), 400
+    
+    import_format = (request.args.get('format') or detect_import_format(filename, request.mimetype) or '').lower()
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'message': f'Unknown import format. Use one of: {list(IMPORT_FORMATS)}'}), 400
+    
+    if _run_async():
+        # Keep the upload in GridFS so whichever worker picks the job up can read it
+        input_file_id = get_job_queue(current_app).save_file(
+            filename or f'upload.{import_format}',
+            iter(lambda: stream.read(64 * 1024), b'')
+        )
+        return _queue_job('import_subscriptions', {'input_file_id': input_file_id, 'format': import_format})
+    
+    # XLSX is a zip archive and needs a seekable file
+    if import_format == 'xlsx' and not upload:
+        spooled = tempfile.TemporaryFile()
+        shutil.copyfileobj(stream, spooled)
+        spooled.seek(0)
+        stream = spooled
+    
+    package_names = Package(current_app.db.db).get_active_package_names()
+    subscription_model = Subscription(current_app.db.db)
+    
+    try:
+        result = subscription_model.import_subscriptions(read_rows(stream, import_format), package_names)
+    except READ_ERRORS + (InvalidFileException,) as e:
+        return jsonify({'message': f'Could not read {import_format} upload: {e}'}), 400
+    
+    return jsonify(result), 200
+
 @subscriptions_bp.route('/search', methods=['GET'])
 @swag_from(subscription_search_spec)
 @jwt_required()
@@ -400,49 +562,54 @@ def search_subscriptions():
     """
     Search subscriptions by various criteria
     ---
-    Perform full-text search across multiple subscription fields including
-    phone numbers, emails, names, and location data.
+    Prefix search across phone numbers, emails, names, and location data,
+    backed by the search_tokens index and ranked by relevance.
     """
     query_param = request.args.get('q', '').strip()
     
     if not query_param:
         return jsonify({'message': 'Search query parameter "q" is required'}), 400
     
-    subscription_model = Subscription(current_app.db.db)
-    
-    # Search in multiple fields
-    search_filters = {
-        'is_active': True,
-        '$or': [
-            {'phone_number': {'$regex': query_param, '$options': 'i'}},
-            {'email': {'$regex': query_param, '$options': 'i'}},
-            {'child_name': {'$regex': query_param, '$options': 'i'}},
-            {'parent_name': {'$regex': query_param, '$options': 'i'}},
-            {'area': {'$regex': query_param, '$options': 'i'}},
-            {'location': {'$regex': query_param, '$options': 'i'}}
-        ]
-    }
-    
     page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 20)), 100)
     
-    result = subscription_model.get_all_subscriptions(search_filters, page, per_page)
+    fields, error = parse_fields(request.args.get('fields'))
+    if error:
+        return jsonify({'message': error}), 400
+    
+    subscription_model = Subscription(current_app.db.db)
+    result = subscription_model.search_subscriptions(
+        query_param, page, per_page, cursor=request.args.get('cursor'),
+        with_total=request.args.get('with_total', 'estimate').lower(),
+        fields=fields
+    )
+    
+    if 'error' in result:
+        return jsonify({'message': result['error']}), 400
+    
     return jsonify(result), 200
 
 @subscriptions_bp.route('/export', methods=['GET'])
 @swag_from({
     "tags": ["Subscriptions"],
     "summary": "Export subscriptions data (Admin only)",
-    "description": "Export subscriptions data in CSV format with optional filtering.",
+    "description": "Stream all matching subscriptions as CSV, JSON, NDJSON, Parquet or XLSX with optional filtering. Exports are not capped and are written as the cursor is read.",
     "security": [{"Bearer": []}],
     "parameters": [
+        {
+            "name": "async",
+            "in": "query",
+            "type": "boolean",
+            "default": False,
+            "description": "Run as a background job and return 202 with a job_id to poll at /api/jobs/{job_id}"
+        },
         {
             "name": "format",
             "in": "query",
             "type": "string",
-            "enum": ["csv", "json"],
+            "enum": ["csv", "json", "ndjson", "parquet", "xlsx"],
             "default": "csv",
-            "description": "Export format"
+            "description": "Export format. parquet keeps typed dates and dictionary-encoded area/package/payment_status columns"
         },
         {
             "name": "agreed_refused",
@@ -490,6 +657,17 @@ def search_subscriptions():
                 }
             }
         },
+        "202": {
+            "description": "Queued as a background job (async=true)",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string"},
+                    "job_id": {"type": "string"},
+                    "status_url": {"type": "string"}
+                }
+            }
+        },
         "400": {
             "description": "Bad request - Invalid parameters",
             "schema": {"$ref": "#/definitions/Error"}
@@ -503,12 +681,55 @@ def search_subscriptions():
 @admin_required
 def export_subscriptions():
     """Export subscriptions data"""
-    from flask import make_response
-    import csv
-    from io import StringIO
-    from datetime import datetime
+    filters, error = _export_filters()
+    if error:
+        return jsonify({'message': error}), 400
     
-    # Build filters
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f'Invalid format. Use one of: {list(EXPORT_FORMATS)}'}), 400
+    
+    if _run_async():
+        return _queue_job('export_subscriptions', {'filters': filters, 'format': export_format})
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f'subscriptions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
+    subscription_model = Subscription(current_app.db.db)
+    rows = subscription_model.iter_subscriptions(
+        filters,
+        EXPORT_FIELDS if export_format != 'json' else None,
+        serialize=export_format not in RAW_FORMATS
+    )
+    
+    if export_format == 'xlsx':
+        # The xlsx zip container can only be written once the sheet is complete
+        output = tempfile.TemporaryFile()
+        write_xlsx(rows, output)
+        output.seek(0)
+        return send_file(output, mimetype=mimetype, as_attachment=True, download_name=filename)
+    
+    return Response(
+        stream_with_context(STREAM_GENERATORS[export_format](rows)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def _run_async():
+    """Whether the caller asked for the operation to run as a background job"""
+    return request.args.get('async', 'false').lower() == 'true'
+
+def _queue_job(job_type, params):
+    """Queue a background job and point the caller at its status URL"""
+    job_id = get_job_queue(current_app).enqueue(job_type, params, user_id=get_jwt_identity())
+    return jsonify({
+        'message': 'Job queued',
+        'job_id': job_id,
+        'status_url': url_for('jobs.get_job', job_id=job_id)
+    }), 202
+
+def _export_filters():
+    """Build export filters from the query string, returns (filters, error)"""
     filters = {'is_active': True}
     
     if request.args.get('agreed_refused'):
@@ -519,71 +740,20 @@ def export_subscriptions():
         filters['area'] = request.args.get('area')
     
     # Date range filter
-    if request.args.get('start_date') or request.args.get('end_date'):
-        date_filter = {}
-        if request.args.get('start_date'):
-            try:
-                start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
-                date_filter['$gte'] = start_date
-            except ValueError:
-                return jsonify({'message': 'Invalid start_date format. Use YYYY-MM-DD'}), 400
-        
-        if request.args.get('end_date'):
-            try:
-                end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
-                date_filter['$lte'] = end_date
-            except ValueError:
-                return jsonify({'message': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
-        
-        if date_filter:
-            filters['date_of_subscription'] = date_filter
-    
-    subscription_model = Subscription(current_app.db.db)
-    result = subscription_model.get_all_subscriptions(filters, page=1, per_page=10000)  # Large limit for export
-    
-    export_format = request.args.get('format', 'csv').lower()
-    
-    if export_format == 'csv':
-        # Generate CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        header = [
-            'ID', 'Phone Number', 'Email', 'Child Name', 'Parent Name',
-            'Agreement Status', 'Package', 'Subscription Date', 'Renewal Date',
-            'Payment Status', 'District', 'Sector', 'Cell', 'Created At'
-        ]
-        writer.writerow(header)
-        
-        # Write data
-        for sub in result['subscriptions']:
-            writer.writerow([
-                sub['_id'],
-                sub['phone_number'],
-                sub['email'],
-                sub['child_name'],
-                sub['parent_name'],
-                sub['agreed_refused'],
-                sub['package'],
-                sub['date_of_subscription'],
-                sub['renew_subscription_by'],
-                sub['payment_status'],
-                sub['area'],
-                sub['location'],
-                sub.get('cell', ''),
-                sub['created_at']
-            ])
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename=subscriptions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        return response
-    
-    elif export_format == 'json':
-        response = make_response(jsonify(result))
-        response.headers['Content-Disposition'] = f'attachment; filename=subscriptions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-        return response
-    
-    else:
-        return jsonify({'message': 'Invalid format. Use csv or json'}), 400
\ No newline at end of file
+    date_filter = {}
+    if request.args.get('start_date'):
+        try:
+            date_filter['$gte'] = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
+        except ValueError:
+            return None, 'Invalid start_date format. Use YYYY-MM-DD'
+    
+    if request.args.get('end_date'):
+        try:
+            date_filter['$lte'] = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
+        except ValueError:
+            return None, 'Invalid end_date format. Use YYYY-MM-DD'
+    
+    if date_filter:
+        filters['date_of_subscription'] = date_filter
+    
+    return filters, None
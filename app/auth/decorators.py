@@ -1,29 +1,33 @@
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 from functools import wraps
 from flask import jsonify, current_app
-from bson import ObjectId
+from .roles import get_user_role
 
 def admin_required(f):
-    """Decorator to require admin role"""
+    """Decorator to require admin role
+    
+    Tokens carry the role as a claim, so non-admin tokens are rejected
+    without any lookup. Admin claims are confirmed against the cached
+    role, which catches demoted and deactivated users.
+    """
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        from app.models import User
-        
-        current_user_id = get_jwt_identity()
-        user_model = User(current_app.db.db)
-        user = user_model.collection.find_one({"_id": ObjectId(current_user_id)})
+        claimed_role = get_jwt().get('role')
+        if claimed_role is not None and claimed_role != 'admin':
+            return jsonify({'message': 'Admin access required'}), 403
         
-        if not user or user.get('role') != 'admin':
+        if get_user_role(get_jwt_identity()) != 'admin':
             return jsonify({'message': 'Admin access required'}), 403
         
         return f(*args, **kwargs)
     return decorated_function
 
-def create_tokens(user_id):
-    """Create access and refresh tokens"""
-    access_token = create_access_token(identity=user_id)
-    refresh_token = create_refresh_token(identity=user_id)
+def create_tokens(user_id, role=None):
+    """Create access and refresh tokens, with the user's role as a claim"""
+    claims = {'role': role} if role else None
+    access_token = create_access_token(identity=user_id, additional_claims=claims)
+    refresh_token = create_refresh_token(identity=user_id, additional_claims=claims)
     return access_token, refresh_token
 
 def get_current_user():
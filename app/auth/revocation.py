@@ -0,0 +1,107 @@
+# Revoked token (JTI) list, mirrored in every process
+import threading
+import time
+from flask import current_app
+from redis.exceptions import RedisError
+
+# Sorted set of revoked JTIs scored by the token's expiry timestamp
+REVOKED_JTIS_KEY = 'revoked_jtis'
+REVOCATION_CHANNEL = 'events:revoked_jtis'
+
+# Pause before resubscribing after losing the Redis connection
+RECONNECT_SECONDS = 1
+
+class RevocationList:
+    """Local copy of the revoked JTIs, kept in sync through Redis pub/sub
+    
+    Revocations are rare and every token is checked, so each process holds
+    all unexpired revoked JTIs in memory and checks tokens without a network
+    call. A background thread (green under eventlet) applies revocations
+    published by other processes and reloads the whole set whenever it
+    (re)subscribes, so nothing published while disconnected is missed.
+    Until the first load has finished, checks go to Redis directly. While
+    Redis is unreachable, checks answer from the last loaded copy.
+    """
+    
+    def __init__(self):
+        self.revoked = {}
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.thread = None
+    
+    def _ensure_started(self, redis_client):
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._run, args=(redis_client,), daemon=True)
+                    self.thread.start()
+    
+    def _run(self, redis_client):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                self._load(redis_client)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        jti, _, expires = self._decode(message['data']).partition(' ')
+                        self._add(jti, float(expires))
+            except RedisError:
+                # Keep answering from the current copy; it is reloaded on resubscribe
+                time.sleep(RECONNECT_SECONDS)
+    
+    def _load(self, redis_client):
+        now = time.time()
+        entries = redis_client.zrangebyscore(REVOKED_JTIS_KEY, now, '+inf', withscores=True)
+        with self.lock:
+            self.revoked = {self._decode(jti): expires for jti, expires in entries}
+        self.synced.set()
+    
+    def _add(self, jti, expires):
+        now = time.time()
+        with self.lock:
+            self.revoked[jti] = expires
+            # Forget tokens that have expired anyway
+            for expired in [key for key, value in self.revoked.items() if value <= now]:
+                del self.revoked[expired]
+    
+    @staticmethod
+    def _decode(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+    
+    def revoke(self, jti, expires):
+        """Revoke a token until its expiry timestamp
+        
+        Returns False if Redis is unavailable, in which case only this
+        process knows about the revocation.
+        """
+        redis_client = current_app.config['SESSION_REDIS']
+        self._ensure_started(redis_client)
+        self._add(jti, expires)
+        
+        pipe = redis_client.pipeline()
+        pipe.zadd(REVOKED_JTIS_KEY, {jti: expires})
+        pipe.zremrangebyscore(REVOKED_JTIS_KEY, '-inf', time.time())
+        pipe.publish(REVOCATION_CHANNEL, f'{jti} {expires}')
+        try:
+            pipe.execute()
+        except RedisError:
+            return False
+        return True
+    
+    def is_revoked(self, jti):
+        """Whether a token has been revoked"""
+        redis_client = current_app.config['SESSION_REDIS']
+        self._ensure_started(redis_client)
+        
+        if not self.synced.is_set():
+            try:
+                return redis_client.zscore(REVOKED_JTIS_KEY, jti) is not None
+            except RedisError:
+                pass
+        
+        with self.lock:
+            expires = self.revoked.get(jti)
+        return expires is not None and expires > time.time()
+
+revocation_list = RevocationList()
@@ -0,0 +1,66 @@
+# Cached user role lookups for authorization checks
+import threading
+import time
+from bson import ObjectId
+from flask import current_app
+from redis.exceptions import RedisError
+
+ROLE_KEY_PREFIX = 'user_role:'
+
+# Stored for users that are missing or deactivated
+NO_ROLE = '-'
+
+# In-process entries are only trusted this long, so an invalidation made
+# by another process is picked up within a few seconds
+LOCAL_ROLE_CACHE_SECONDS = 5
+
+_local_roles = {}
+_local_lock = threading.Lock()
+
+def get_user_role(user_id):
+    """Role of an active user, None if the user is missing or deactivated
+    
+    Looks in a short-lived in-process cache, then Redis, and only then
+    reads the users collection.
+    """
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local_roles.get(user_id)
+    if entry and entry[1] > now:
+        return entry[0]
+    
+    role = None
+    redis_client = current_app.config['SESSION_REDIS']
+    try:
+        role = redis_client.get(ROLE_KEY_PREFIX + user_id)
+    except RedisError:
+        pass
+    
+    if role is None:
+        from app.models import User
+        
+        user = None
+        if ObjectId.is_valid(user_id):
+            user = User(current_app.db.db).collection.find_one(
+                {"_id": ObjectId(user_id), "is_active": True},
+                {"role": 1}
+            )
+        role = (user or {}).get('role') or NO_ROLE
+        try:
+            redis_client.set(ROLE_KEY_PREFIX + user_id, role, ex=current_app.config.get('ROLE_CACHE_SECONDS', 300))
+        except RedisError:
+            pass
+    
+    role = role.decode('utf-8') if isinstance(role, bytes) else role
+    with _local_lock:
+        _local_roles[user_id] = (role, now + LOCAL_ROLE_CACHE_SECONDS)
+    return None if role == NO_ROLE else role
+
+def invalidate_user_role(user_id):
+    """Forget a user's cached role after a role change or deactivation"""
+    with _local_lock:
+        _local_roles.pop(user_id, None)
+    try:
+        current_app.config['SESSION_REDIS'].delete(ROLE_KEY_PREFIX + user_id)
+    except RedisError:
+        pass
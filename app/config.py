@@ -8,6 +8,10 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'JHbrx0GvNulhV6uKP+UWXE/FNZbHASAQgy1E1Cs60SE='
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # bcrypt work factor; existing hashes are upgraded on the next successful login
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    # Seconds a user's role is cached in Redis for admin checks
+    ROLE_CACHE_SECONDS = int(os.environ.get('ROLE_CACHE_SECONDS', 300))
     
     # Redis configuration
     REDIS_HOST = os.environ.get('REDIS_HOST') or 'localhost'
@@ -18,6 +22,33 @@ class Config:
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
     SESSION_KEY_PREFIX = 'subscription_app:'
+    
+    # Background jobs: how long job state and result files are kept
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 7 * 24 * 3600))
+    
+    # Seconds report responses may be served from cache (0 disables caching).
+    # Cached reports are also invalidated by every subscription write.
+    REPORT_CACHE_SECONDS = int(os.environ.get('REPORT_CACHE_SECONDS', 300))
+    DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 30))
+    # Cohort matrices are computed once per day per filter combination
+    COHORT_CACHE_SECONDS = int(os.environ.get('COHORT_CACHE_SECONDS', 24 * 3600))
+    
+    # Live dashboard stream: keepalive interval and how often a full snapshot is resent
+    LIVE_HEARTBEAT_SECONDS = int(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+    LIVE_SNAPSHOT_SECONDS = int(os.environ.get('LIVE_SNAPSHOT_SECONDS', 300))
+    
+    # Token-bucket budgets ("<count>/<second|minute|hour|day>") for public endpoints,
+    # per client IP and for each route as a whole
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    PUBLIC_SUBSCRIBE_LIMIT_PER_IP = os.environ.get('PUBLIC_SUBSCRIBE_LIMIT_PER_IP', '10/minute')
+    PUBLIC_SUBSCRIBE_LIMIT = os.environ.get('PUBLIC_SUBSCRIBE_LIMIT', '600/minute')
+    PUBLIC_EXPORT_LIMIT_PER_IP = os.environ.get('PUBLIC_EXPORT_LIMIT_PER_IP', '5/minute')
+    PUBLIC_EXPORT_LIMIT = os.environ.get('PUBLIC_EXPORT_LIMIT', '60/minute')
+    
+    # Seconds a response is replayed for a repeated Idempotency-Key, and for an
+    # identical request body sent without one
+    IDEMPOTENCY_KEY_SECONDS = int(os.environ.get('IDEMPOTENCY_KEY_SECONDS', 24 * 3600))
+    IDEMPOTENCY_CONTENT_SECONDS = int(os.environ.get('IDEMPOTENCY_CONTENT_SECONDS', 300))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -270,7 +270,7 @@ health_check_spec = {
 subscription_search_spec = {
     "tags": ["Subscriptions"],
     "summary": "Search subscriptions",
-    "description": "Search subscriptions across multiple fields including phone number, email, names, and location data.",
+    "description": "Search subscriptions across phone number, email, names, and location data. Every word of q must match the start of a word in one of these fields; words shorter than 2 characters are ignored. Only the newest 1000 matches are ranked, by exact word matches and then newest first, and totals are capped at 1000.",
     "security": [{"Bearer": []}],
     "parameters": [
         {
@@ -297,6 +297,26 @@ subscription_search_spec = {
             "maximum": 100,
             "default": 20,
             "description": "Number of items per page"
+        },
+        {
+            "name": "cursor",
+            "in": "query",
+            "type": "string",
+            "description": "Opaque cursor from a previous response's next_cursor. Takes precedence over page"
+        },
+        {
+            "name": "with_total",
+            "in": "query",
+            "type": "string",
+            "enum": ["true", "false", "estimate"],
+            "default": "estimate",
+            "description": "Exact total (an extra count query), no total, or a cheap estimated total"
+        },
+        {
+            "name": "fields",
+            "in": "query",
+            "type": "string",
+            "description": "Comma separated list of fields to return, e.g. child_name,phone_number,area,renew_subscription_by"
         }
     ],
     "responses": {
@@ -347,6 +367,26 @@ subscription_list_spec = {
             "default": 20,
             "description": "Number of items per page"
         },
+        {
+            "name": "cursor",
+            "in": "query",
+            "type": "string",
+            "description": "Opaque cursor from a previous response's next_cursor. Takes precedence over page"
+        },
+        {
+            "name": "with_total",
+            "in": "query",
+            "type": "string",
+            "enum": ["true", "false", "estimate"],
+            "default": "estimate",
+            "description": "Exact total (an extra count query), no total, or a cheap estimated total"
+        },
+        {
+            "name": "fields",
+            "in": "query",
+            "type": "string",
+            "description": "Comma separated list of fields to return, e.g. child_name,phone_number,area,renew_subscription_by"
+        },
         {
             "name": "agreed_refused",
             "in": "query",
@@ -0,0 +1,5 @@
+from .queue import JobQueue, Job
+from .handlers import JOB_HANDLERS, job_handler
+from .worker import JobWorker, get_job_queue
+
+__all__ = ['JobQueue', 'Job', 'JOB_HANDLERS', 'job_handler', 'JobWorker', 'get_job_queue']
@@ -0,0 +1,99 @@
+import json
+import tempfile
+from datetime import datetime
+from flask import current_app
+from app.models import Subscription, Package
+from app.utils.export import EXPORT_FIELDS, EXPORT_FORMATS, RAW_FORMATS, STREAM_GENERATORS, write_xlsx
+from app.utils.imports import read_rows
+
+# job type -> handler(job) returning a JSON-serializable result summary
+JOB_HANDLERS = {}
+
+# Report progress every this many processed items
+PROGRESS_EVERY = 1000
+
+def job_handler(job_type):
+    """Register a function as the handler for `job_type`"""
+    def decorator(f):
+        JOB_HANDLERS[job_type] = f
+        return f
+    return decorator
+
+def _counted(items, job, total=None):
+    """Pass items through while reporting progress on `job`"""
+    count = 0
+    for item in items:
+        yield item
+        count += 1
+        if count % PROGRESS_EVERY == 0:
+            job.progress(count, total)
+    job.progress(count, total)
+
+def _file_chunks(fileobj, size=64 * 1024):
+    """Read a file object in chunks"""
+    while True:
+        chunk = fileobj.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+@job_handler('export_subscriptions')
+def export_subscriptions(job):
+    """Write a subscriptions export to a downloadable artifact"""
+    export_format = job.params['format']
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {export_format}')
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f'subscriptions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
+    subscription_model = Subscription(current_app.db.db)
+    rows = _counted(subscription_model.iter_subscriptions(
+        job.params['filters'],
+        EXPORT_FIELDS if export_format != 'json' else None,
+        serialize=export_format not in RAW_FORMATS
+    ), job)
+    
+    if export_format == 'xlsx':
+        with tempfile.TemporaryFile() as output:
+            write_xlsx(rows, output)
+            output.seek(0)
+            job.save_artifact(filename, _file_chunks(output), mimetype)
+    else:
+        job.save_artifact(filename, STREAM_GENERATORS[export_format](rows), mimetype)
+    
+    return {'filename': filename}
+
+@job_handler('import_subscriptions')
+def import_subscriptions(job):
+    """Import an uploaded file previously stored with JobQueue.save_file"""
+    upload = job.queue.open_file(job.params['input_file_id'])
+    if upload is None:
+        raise ValueError('Uploaded file is no longer available')
+    
+    try:
+        package_names = Package(current_app.db.db).get_active_package_names()
+        subscription_model = Subscription(current_app.db.db)
+        rows = _counted(read_rows(upload, job.params['format']), job)
+        result = subscription_model.import_subscriptions(rows, package_names)
+    finally:
+        job.queue.delete_file(job.params['input_file_id'])
+    
+    # The per-row error report can be large, keep it as a downloadable artifact
+    job.save_artifact('import_report.json', [json.dumps(result)], 'application/json')
+    return {key: result[key] for key in ('total_rows', 'inserted', 'failed')}
+
+@job_handler('bulk_update_subscriptions')
+def bulk_update_subscriptions(job):
+    """Apply a bulk update and keep the per-ID report as an artifact"""
+    subscription_model = Subscription(current_app.db.db)
+    result = subscription_model.bulk_update_subscriptions(
+        job.params['subscription_ids'],
+        job.params['update_data'],
+        progress=job.progress
+    )
+    if 'error' in result:
+        raise ValueError(result['error'])
+    
+    job.save_artifact('bulk_update_report.json', [json.dumps(result)], 'application/json')
+    failed = sum(1 for item in result['results'] if 'error' in item['result'])
+    return {'total': len(result['results']), 'updated': len(result['results']) - failed, 'failed': failed}
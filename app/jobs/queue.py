@@ -0,0 +1,202 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId, json_util
+import gridfs
+
+# Redis list the API pushes job ids onto and workers pop from
+JOB_QUEUE_KEY = 'jobs:queue'
+JOB_KEY_PREFIX = 'job:'
+
+# Each worker moves the job it takes onto its own processing list, so the
+# job is not lost if the worker dies. Live workers keep a heartbeat key.
+WORKERS_KEY = 'jobs:workers'
+PROCESSING_KEY_PREFIX = 'jobs:processing:'
+WORKER_KEY_PREFIX = 'jobs:worker:'
+WORKER_HEARTBEAT_TTL = 60
+
+# GridFS bucket holding job inputs (uploads) and result artifacts
+ARTIFACT_BUCKET = 'job_artifacts'
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+class JobQueue:
+    """Redis-backed queue for long-running operations
+    
+    Job state lives in a Redis hash per job, the queue is a Redis list and
+    large inputs/outputs are stored in GridFS so any worker can read them
+    and the API can serve them after the job is done.
+    """
+    
+    def __init__(self, redis_client, db, result_ttl=7 * 24 * 3600):
+        self.redis = redis_client
+        self.artifacts = gridfs.GridFSBucket(db, bucket_name=ARTIFACT_BUCKET)
+        self.files = db[f'{ARTIFACT_BUCKET}.files']
+        self.result_ttl = result_ttl
+    
+    def enqueue(self, job_type, params, user_id=None):
+        """Queue a job and return its id"""
+        job_id = uuid.uuid4().hex
+        key = JOB_KEY_PREFIX + job_id
+        
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={
+            'job_id': job_id,
+            'type': job_type,
+            'status': QUEUED,
+            'params': json_util.dumps(params),
+            'user_id': user_id or '',
+            'progress': 0,
+            'created_at': datetime.utcnow().isoformat()
+        })
+        pipe.expire(key, self.result_ttl)
+        pipe.lpush(JOB_QUEUE_KEY, job_id)
+        pipe.execute()
+        return job_id
+    
+    def dequeue(self, worker_id, timeout=5):
+        """Block up to `timeout` seconds for the next job id
+        
+        The id is moved onto the worker's processing list in the same step;
+        call `ack` once the job has finished or failed.
+        """
+        job_id = self.redis.blmove(JOB_QUEUE_KEY, PROCESSING_KEY_PREFIX + worker_id, timeout, 'RIGHT', 'LEFT')
+        if not job_id:
+            return None
+        return job_id.decode('utf-8') if isinstance(job_id, bytes) else job_id
+    
+    def ack(self, worker_id, job_id):
+        """Remove a handled job from the worker's processing list"""
+        self.redis.lrem(PROCESSING_KEY_PREFIX + worker_id, 0, job_id)
+    
+    def register_worker(self, worker_id):
+        """Announce a worker; its jobs are recovered if the heartbeat lapses"""
+        pipe = self.redis.pipeline()
+        pipe.sadd(WORKERS_KEY, worker_id)
+        pipe.set(WORKER_KEY_PREFIX + worker_id, 1, ex=WORKER_HEARTBEAT_TTL)
+        pipe.execute()
+    
+    def heartbeat(self, worker_id):
+        """Keep a worker's registration alive"""
+        self.redis.set(WORKER_KEY_PREFIX + worker_id, 1, ex=WORKER_HEARTBEAT_TTL)
+    
+    def unregister_worker(self, worker_id):
+        """Remove a worker that stopped cleanly"""
+        pipe = self.redis.pipeline()
+        pipe.srem(WORKERS_KEY, worker_id)
+        pipe.delete(WORKER_KEY_PREFIX + worker_id)
+        pipe.execute()
+    
+    def recover_stale_jobs(self):
+        """Take back the jobs of workers whose heartbeat has lapsed
+        
+        Jobs that had not started yet are queued again. Jobs that were
+        running are marked failed rather than retried, since a half-done
+        import or bulk update must not be applied twice.
+        Returns (requeued, failed) counts.
+        """
+        requeued = failed = 0
+        for worker_id in self.redis.smembers(WORKERS_KEY):
+            worker_id = worker_id.decode('utf-8') if isinstance(worker_id, bytes) else worker_id
+            if self.redis.exists(WORKER_KEY_PREFIX + worker_id):
+                continue
+            
+            processing_key = PROCESSING_KEY_PREFIX + worker_id
+            while True:
+                # RPOP hands each entry to exactly one recovering worker
+                job_id = self.redis.rpop(processing_key)
+                if job_id is None:
+                    break
+                job_id = job_id.decode('utf-8') if isinstance(job_id, bytes) else job_id
+                state = self.get(job_id)
+                if state is None:
+                    continue
+                if state['status'] == QUEUED:
+                    self.redis.rpush(JOB_QUEUE_KEY, job_id)
+                    requeued += 1
+                elif state['status'] == RUNNING:
+                    self.update(job_id, status=FAILED, error='The worker running this job stopped unexpectedly',
+                                finished_at=datetime.utcnow().isoformat())
+                    failed += 1
+            self.redis.srem(WORKERS_KEY, worker_id)
+        return requeued, failed
+    
+    def get(self, job_id):
+        """Get job state, None if unknown or expired"""
+        raw = self.redis.hgetall(JOB_KEY_PREFIX + job_id)
+        if not raw:
+            return None
+        
+        job = {
+            (k.decode('utf-8') if isinstance(k, bytes) else k): (v.decode('utf-8') if isinstance(v, bytes) else v)
+            for k, v in raw.items()
+        }
+        job['params'] = json_util.loads(job['params'])
+        job['progress'] = int(job.get('progress', 0))
+        if job.get('total'):
+            job['total'] = int(job['total'])
+        if job.get('result'):
+            job['result'] = json.loads(job['result'])
+        return job
+    
+    def update(self, job_id, **fields):
+        """Update job state fields"""
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        self.redis.hset(JOB_KEY_PREFIX + job_id, mapping={k: v for k, v in fields.items() if v is not None})
+    
+    def save_file(self, filename, chunks, mimetype='application/octet-stream', job_id=None):
+        """Store str/bytes chunks in GridFS and return the file id as a string"""
+        metadata = {
+            'mimetype': mimetype,
+            'job_id': job_id,
+            'expires_at': datetime.utcnow() + timedelta(seconds=self.result_ttl)
+        }
+        with self.artifacts.open_upload_stream(filename, metadata=metadata) as upload:
+            for chunk in chunks:
+                upload.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            return str(upload._id)
+    
+    def open_file(self, file_id):
+        """Open a stored file for reading, None if it no longer exists"""
+        try:
+            return self.artifacts.open_download_stream(ObjectId(file_id))
+        except gridfs.errors.NoFile:
+            return None
+    
+    def delete_file(self, file_id):
+        """Delete a stored file"""
+        try:
+            self.artifacts.delete(ObjectId(file_id))
+        except gridfs.errors.NoFile:
+            pass
+    
+    def purge_expired_files(self):
+        """Delete stored files whose jobs have expired, returns how many were removed"""
+        expired = [f['_id'] for f in self.files.find({'metadata.expires_at': {'$lt': datetime.utcnow()}}, {'_id': 1})]
+        for file_id in expired:
+            self.artifacts.delete(file_id)
+        return len(expired)
+
+class Job:
+    """Handle passed to job handlers to read params and report progress"""
+    
+    def __init__(self, queue, job_id, params):
+        self.queue = queue
+        self.job_id = job_id
+        self.params = params
+        self.artifact = None
+    
+    def progress(self, done, total=None):
+        """Report how many items have been processed so far"""
+        self.queue.update(self.job_id, progress=done, total=total)
+    
+    def save_artifact(self, filename, chunks, mimetype):
+        """Store the job's downloadable result"""
+        file_id = self.queue.save_file(filename, chunks, mimetype, job_id=self.job_id)
+        self.artifact = {'file_id': file_id, 'filename': filename, 'mimetype': mimetype}
+        return file_id
@@ -0,0 +1,105 @@
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from .queue import JobQueue, Job, RUNNING, FINISHED, FAILED, WORKER_HEARTBEAT_TTL
+from .handlers import JOB_HANDLERS
+
+# Seconds between sweeps for expired job files
+PURGE_INTERVAL = 3600
+
+# Seconds between checks for jobs left behind by workers that died
+RECOVER_INTERVAL = WORKER_HEARTBEAT_TTL
+
+class JobWorker:
+    """Pop jobs from the queue and run their handlers inside the app context"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.queue = get_job_queue(app)
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.running = True
+        self.last_purge = 0
+        self.last_recover = 0
+    
+    def stop(self, *args):
+        """Finish the current job, then exit"""
+        self.running = False
+    
+    def run(self):
+        """Process jobs until stopped"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        self.queue.register_worker(self.worker_id)
+        # Heartbeats run on their own thread so long jobs do not let them lapse
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+        
+        try:
+            while self.running:
+                if time.time() - self.last_recover > RECOVER_INTERVAL:
+                    self.queue.recover_stale_jobs()
+                    self.last_recover = time.time()
+                if time.time() - self.last_purge > PURGE_INTERVAL:
+                    self.queue.purge_expired_files()
+                    self.last_purge = time.time()
+                
+                job_id = self.queue.dequeue(self.worker_id, timeout=5)
+                if job_id:
+                    try:
+                        self.run_job(job_id)
+                    finally:
+                        self.queue.ack(self.worker_id, job_id)
+        finally:
+            self.queue.unregister_worker(self.worker_id)
+    
+    def _heartbeat(self):
+        while self.running:
+            try:
+                self.queue.heartbeat(self.worker_id)
+            except Exception:
+                traceback.print_exc()
+            time.sleep(WORKER_HEARTBEAT_TTL / 3)
+    
+    def run_job(self, job_id):
+        """Run a single job and record its outcome"""
+        state = self.queue.get(job_id)
+        if state is None:
+            return
+        
+        handler = JOB_HANDLERS.get(state['type'])
+        if handler is None:
+            self.queue.update(job_id, status=FAILED, error=f"Unknown job type: {state['type']}")
+            return
+        
+        self.queue.update(job_id, status=RUNNING, started_at=datetime.utcnow().isoformat())
+        job = Job(self.queue, job_id, state['params'])
+        
+        try:
+            with self.app.app_context():
+                result = handler(job)
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.update(job_id, status=FAILED, error=str(e), finished_at=datetime.utcnow().isoformat())
+            return
+        
+        fields = {'status': FINISHED, 'result': result, 'finished_at': datetime.utcnow().isoformat()}
+        if job.artifact:
+            fields.update({
+                'artifact_id': job.artifact['file_id'],
+                'artifact_filename': job.artifact['filename'],
+                'artifact_mimetype': job.artifact['mimetype']
+            })
+        self.queue.update(job_id, **fields)
+
+def get_job_queue(app):
+    """Build the job queue on the app's Redis client and database"""
+    return JobQueue(
+        app.config['SESSION_REDIS'],
+        app.db.db,
+        result_ttl=app.config.get('JOB_RESULT_TTL', 7 * 24 * 3600)
+    )
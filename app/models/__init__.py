@@ -2,6 +2,7 @@ from .database import Database
 from .user import User
 from .subscription import Subscription
 from .package import Package
+from .daily_stats import DailyStats
 from .geography import get_kigali_districts, get_sectors_by_district, get_cells_by_sector
 
 __all__ = [
@@ -9,6 +10,7 @@ __all__ = [
     'User', 
     'Subscription',
     'Package',
+    'DailyStats',
     'get_kigali_districts',
     'get_sectors_by_district', 
     'get_cells_by_sector'
@@ -0,0 +1,336 @@
+import logging
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from app.utils.cache import bump_data_version
+from app.utils.events import publish_event
+
+# Subscription fields the daily rollup is broken down by, besides the day
+ROLLUP_DIMENSIONS = ('area', 'location', 'package', 'agreed_refused', 'payment_status')
+
+# Fields a subscription's rollup bucket depends on
+ROLLUP_SOURCE_FIELDS = ROLLUP_DIMENSIONS + ('date_of_subscription', 'is_active')
+
+# Times a rollup write is retried after losing an upsert race on the unique index
+ROLLUP_WRITE_RETRIES = 3
+DUPLICATE_KEY_ERROR = 11000
+
+logger = logging.getLogger(__name__)
+
+# Reports bucket calendar days in the local timezone
+REPORT_TIMEZONE = 'Africa/Kigali'
+
+# granularity -> $dateToString format of its bucket key
+TREND_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-%V',
+    'month': '%Y-%m'
+}
+
+def period_start(day, granularity):
+    """First day of the day/ISO week/month containing `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def parse_period(key, granularity):
+    """First day of the period a TREND_FORMATS bucket key stands for"""
+    if granularity == 'week':
+        year, week = key.split('-')
+        return date.fromisocalendar(int(year), int(week), 1)
+    if granularity == 'month':
+        return datetime.strptime(key, '%Y-%m').date()
+    return datetime.strptime(key, '%Y-%m-%d').date()
+
+def iter_periods(start, end, granularity):
+    """First days of every period from the one containing `start` to the one containing `end`"""
+    period = period_start(start, granularity)
+    while period <= end:
+        yield period
+        if granularity == 'month':
+            period = (period + timedelta(days=32)).replace(day=1)
+        else:
+            period += timedelta(days=7 if granularity == 'week' else 1)
+
+def rollup_key(sub):
+    """Rollup bucket of a subscription as (day, area, location, package, agreed_refused, payment_status)
+    
+    Returns None for subscriptions that are not counted (inactive or undated).
+    """
+    if not sub or not sub.get('is_active', True):
+        return None
+    date_of_subscription = sub.get('date_of_subscription')
+    if not isinstance(date_of_subscription, datetime):
+        return None
+    
+    day = date_of_subscription.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (day,) + tuple(sub.get(field) for field in ROLLUP_DIMENSIONS)
+
+def counter_deltas(deltas):
+    """Turn rollup bucket deltas into changes of the dashboard-stats counters
+    
+    Returns only the counters that changed, nested like the dashboard-stats
+    response. upcoming_renewals does not depend on the bucket and is left out.
+    """
+    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    counters = Counter()
+    payments = Counter()
+    for (day, _, _, _, agreed_refused, payment_status), delta in deltas.items():
+        counters['total_subscriptions'] += delta
+        if agreed_refused == 'Agreed':
+            counters['total_agreed'] += delta
+        elif agreed_refused == 'Refused':
+            counters['total_refused'] += delta
+        if day >= start_of_month:
+            counters['this_month_subscriptions'] += delta
+        if payment_status in ('Paid', 'Pending', 'Failed'):
+            payments[payment_status.lower()] += delta
+    
+    result = {name: value for name, value in counters.items() if value}
+    if any(payments.values()):
+        result['payment_breakdown'] = {name: value for name, value in payments.items() if value}
+    return result
+
+def _key_filter(key):
+    return dict(zip(('day',) + ROLLUP_DIMENSIONS, key))
+
+class DailyStats:
+    """Active subscription counts per day x area x sector x package x agreement x payment status
+    
+    The subscription write paths keep the `subscription_daily_stats`
+    collection up to date incrementally; `rebuild` recomputes it from
+    scratch. Reports aggregate over these rows, whose number grows with
+    days rather than with subscriptions.
+    """
+    
+    def __init__(self, db):
+        self.collection = db.subscription_daily_stats
+        self.subscriptions = db.subscriptions
+    
+    def record(self, before=None, after=None):
+        """Move one subscription from the `before` bucket to the `after` bucket
+        
+        Pass before=None for a new subscription and after=None for a removed one.
+        """
+        self.record_many([(before, after)])
+    
+    def record_many(self, changes):
+        """Apply many (before, after) subscription changes in one bulk write
+        
+        The subscription write has already happened, so failures here are
+        logged rather than raised; `rebuild` repairs a rollup that drifted.
+        """
+        deltas = Counter()
+        for before, after in changes:
+            old_key, new_key = rollup_key(before), rollup_key(after)
+            if old_key == new_key:
+                continue
+            if old_key:
+                deltas[old_key] -= 1
+            if new_key:
+                deltas[new_key] += 1
+        
+        operations = []
+        for key, delta in deltas.items():
+            if delta == 0:
+                continue
+            operations.append(UpdateOne(_key_filter(key), {"$inc": {"count": delta}}, upsert=True))
+            if delta < 0:
+                # Drop buckets that became empty
+                operations.append(DeleteOne({**_key_filter(key), "count": {"$lte": 0}}))
+        
+        if operations and self._write(operations):
+            counters = counter_deltas(deltas)
+            if counters:
+                # Invalidate cached snapshots first: a live client that
+                # reconnects after this event must not load a pre-write one
+                bump_data_version()
+                publish_event('counters', counters)
+    
+    def _write(self, operations):
+        """Run an ordered bulk write, retrying from an upsert that lost a race"""
+        for _ in range(ROLLUP_WRITE_RETRIES + 1):
+            try:
+                self.collection.bulk_write(operations)
+                return True
+            except BulkWriteError as e:
+                write_errors = e.details.get('writeErrors', [])
+                # Two first writes to a new bucket can both try to insert it;
+                # the loser's $inc applies to the winner's document on retry
+                if not write_errors or write_errors[0]['code'] != DUPLICATE_KEY_ERROR:
+                    logger.exception("Daily stats rollup write failed, run a rebuild")
+                    return False
+                operations = operations[write_errors[0]['index']:]
+            except PyMongoError:
+                logger.exception("Daily stats rollup write failed, run a rebuild")
+                return False
+        logger.error("Daily stats rollup write kept conflicting, run a rebuild")
+        return False
+    
+    def rebuild(self):
+        """Recompute the rollup from the subscriptions collection
+        
+        $out swaps the new rollup in atomically and keeps its indexes.
+        Returns the number of buckets.
+        
+        Run it with subscription writes stopped: counts incremented while the
+        aggregation runs land in the old collection and are discarded by the
+        swap, so the rebuilt rollup would be off by those writes.
+        """
+        group_id = {"day": {"$dateFromParts": {
+            "year": {"$year": "$date_of_subscription"},
+            "month": {"$month": "$date_of_subscription"},
+            "day": {"$dayOfMonth": "$date_of_subscription"}
+        }}}
+        group_id.update({field: f"${field}" for field in ROLLUP_DIMENSIONS})
+        
+        pipeline = [
+            {"$match": {"is_active": True, "date_of_subscription": {"$type": "date"}}},
+            {"$group": {"_id": group_id, "count": {"$sum": 1}}},
+            {"$project": {
+                "_id": 0,
+                "count": 1,
+                **{field: f"$_id.{field}" for field in ('day',) + ROLLUP_DIMENSIONS}
+            }},
+            {"$out": self.collection.name}
+        ]
+        self.subscriptions.aggregate(pipeline)
+        bump_data_version()
+        return self.collection.estimated_document_count()
+    
+    def trends(self, granularity, start, end):
+        """Total and agreed subscriptions per period between two dates (inclusive)
+        
+        Returns one {"period", "total", "agreed"} row per day, ISO week or
+        month from the period containing `start` to the one containing `end`,
+        oldest first, with empty periods included as zeros. The first period
+        is always counted in full, even when `start` falls inside it.
+        """
+        start = period_start(start, granularity)
+        pipeline = [
+            {"$match": {"day": {
+                "$gte": datetime.combine(start, time.min),
+                "$lte": datetime.combine(end, time.min)
+            }}},
+            self._period_group(granularity)
+        ]
+        counts = {
+            parse_period(item["_id"], granularity): item
+            for item in self.collection.aggregate(pipeline)
+        }
+        
+        return [
+            {
+                "period": period,
+                "total": counts.get(period, {}).get("total", 0),
+                "agreed": counts.get(period, {}).get("agreed", 0)
+            }
+            for period in iter_periods(start, end, granularity)
+        ]
+    
+    def latest_periods(self, granularity, limit):
+        """Total and agreed subscriptions for the latest `limit` periods that have any
+        
+        Returns {"period", "total", "agreed"} rows newest first. Unlike
+        `trends`, empty periods are skipped and the range is not tied to
+        today, so past data and future-dated subscriptions are included.
+        """
+        pipeline = [
+            {"$match": {"count": {"$gt": 0}}},
+            self._period_group(granularity),
+            {"$sort": {"_id": -1}},
+            {"$limit": limit}
+        ]
+        return [
+            {
+                "period": parse_period(item["_id"], granularity),
+                "total": item["total"],
+                "agreed": item["agreed"]
+            }
+            for item in self.collection.aggregate(pipeline)
+        ]
+    
+    @staticmethod
+    def _period_group(granularity):
+        """$group stage summing total and agreed subscriptions per trend period"""
+        return {"$group": {
+            "_id": {"$dateToString": {
+                "format": TREND_FORMATS[granularity],
+                "date": "$day",
+                "timezone": REPORT_TIMEZONE
+            }},
+            "total": {"$sum": "$count"},
+            "agreed": {
+                "$sum": {"$cond": [{"$eq": ["$agreed_refused", "Agreed"]}, "$count", 0]}
+            }
+        }}
+    
+    def revenue(self, prices, start=None, end=None):
+        """Agreed subscriptions and their revenue per month x package x area x payment status
+        
+        `prices` maps package names to prices and is inlined into the
+        aggregation as a $switch, so no package is looked up per row.
+        Packages missing from `prices` count as 0. Returns rows of
+        {"month": "YYYY-MM", "package", "area", "payment_status", "subscriptions", "revenue"}.
+        """
+        match = {"agreed_refused": "Agreed"}
+        if start or end:
+            match["day"] = {}
+            if start:
+                match["day"]["$gte"] = datetime.combine(start, time.min)
+            if end:
+                match["day"]["$lte"] = datetime.combine(end, time.min)
+        
+        price = {"$switch": {
+            "branches": [{"case": {"$eq": ["$package", name]}, "then": value} for name, value in prices.items()],
+            "default": 0
+        }} if prices else 0
+        
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "month": {"$dateToString": {"format": "%Y-%m", "date": "$day", "timezone": REPORT_TIMEZONE}},
+                    "package": "$package",
+                    "area": "$area",
+                    "payment_status": "$payment_status"
+                },
+                "subscriptions": {"$sum": "$count"},
+                "revenue": {"$sum": {"$multiply": ["$count", price]}}
+            }},
+            {"$sort": {"_id.month": 1}}
+        ]
+        
+        return [
+            {**item["_id"], "subscriptions": item["subscriptions"], "revenue": item["revenue"]}
+            for item in self.collection.aggregate(pipeline)
+        ]
+    
+    def area_distribution(self):
+        """Total and agreed subscriptions per district, largest first"""
+        pipeline = [
+            {"$group": {
+                "_id": "$area",
+                "total": {"$sum": "$count"},
+                "agreed": {
+                    "$sum": {"$cond": [{"$eq": ["$agreed_refused", "Agreed"]}, "$count", 0]}
+                }
+            }},
+            {"$sort": {"total": -1}}
+        ]
+        return list(self.collection.aggregate(pipeline))
+    
+    def package_popularity(self):
+        """Agreed subscriptions per package, most popular first"""
+        pipeline = [
+            {"$match": {"agreed_refused": "Agreed"}},
+            {"$group": {
+                "_id": "$package",
+                "count": {"$sum": "$count"}
+            }},
+            {"$sort": {"count": -1}}
+        ]
+        return list(self.collection.aggregate(pipeline))
@@ -17,6 +17,18 @@ class Database:
         self.db.subscriptions.create_index("email")
         self.db.subscriptions.create_index("date_of_subscription")
         self.db.subscriptions.create_index("renew_subscription_by")
+        # Listing order, used by both page and cursor pagination
+        self.db.subscriptions.create_index([("is_active", 1), ("created_at", -1), ("_id", -1)])
+        # Prefix search on normalized name/email/phone/location tokens
+        self.db.subscriptions.create_index([("search_tokens", 1), ("is_active", 1)])
+        # Exact/prefix lookup on E.164 normalized phone numbers
+        self.db.subscriptions.create_index([("phone_e164", 1), ("is_active", 1)])
+        
+        # Daily rollup buckets, one document per day x dimension combination
+        self.db.subscription_daily_stats.create_index(
+            [("day", 1), ("area", 1), ("location", 1), ("package", 1), ("agreed_refused", 1), ("payment_status", 1)],
+            unique=True
+        )
         
         # Packages collection indexes
         self.db.packages.create_index("name")
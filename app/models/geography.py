@@ -86,4 +86,67 @@ def validate_location(area, location, cell=None):
         if cell not in valid_cells:
             return False, f"Invalid cell for {area}/{location}. Must be one of: {valid_cells}"
     
-    return True, "Valid location"
\ No newline at end of file
+    return True, "Valid location"
+
+# Name used in the geo tree for subscriptions without an area or location
+UNKNOWN_PLACE = "Unknown"
+
+def build_geo_tree(counts):
+    """Nest (area, location, cell) -> (total, agreed) counts as a district -> sector -> cell tree
+    
+    The tree follows KIGALI_DISTRICTS, including places without subscriptions.
+    Counts for places outside the map are appended after the known ones, and
+    subscriptions without a cell only count towards their sector. Those
+    without an area or location are grouped under an "Unknown" district or
+    sector, so every subscription is counted exactly once.
+    """
+    def node(name, total, agreed, children=None):
+        result = {
+            "name": name,
+            "total_subscriptions": total,
+            "agreed_subscriptions": agreed,
+            "success_rate": round((agreed / total * 100), 2) if total > 0 else 0
+        }
+        if children is not None:
+            result["children"] = children
+        return result
+    
+    tree = {}
+    for district, district_data in KIGALI_DISTRICTS.items():
+        tree[district] = {sector: {cell: [0, 0] for cell in cells} for sector, cells in district_data["sectors"].items()}
+    
+    sector_extra = {}
+    for (area, location, cell), (total, agreed) in counts.items():
+        area = area or UNKNOWN_PLACE
+        location = location or UNKNOWN_PLACE
+        sectors = tree.setdefault(area, {})
+        cells = sectors.setdefault(location, {})
+        if cell:
+            cell_counts = cells.setdefault(cell, [0, 0])
+            cell_counts[0] += total
+            cell_counts[1] += agreed
+        else:
+            extra = sector_extra.setdefault((area, location), [0, 0])
+            extra[0] += total
+            extra[1] += agreed
+    
+    districts = []
+    for district, sectors in tree.items():
+        sector_nodes = []
+        for sector, cells in sectors.items():
+            cell_nodes = [node(cell, total, agreed) for cell, (total, agreed) in cells.items()]
+            extra_total, extra_agreed = sector_extra.get((district, sector), (0, 0))
+            sector_nodes.append(node(
+                sector,
+                sum(cell["total_subscriptions"] for cell in cell_nodes) + extra_total,
+                sum(cell["agreed_subscriptions"] for cell in cell_nodes) + extra_agreed,
+                cell_nodes
+            ))
+        districts.append(node(
+            district,
+            sum(sector["total_subscriptions"] for sector in sector_nodes),
+            sum(sector["agreed_subscriptions"] for sector in sector_nodes),
+            sector_nodes
+        ))
+    
+    return districts
\ No newline at end of file
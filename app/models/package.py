@@ -1,5 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
+from app.utils.cache import bump_data_version
 
 class Package:
     def __init__(self, db):
@@ -24,6 +25,8 @@ class Package:
         }
         
         result = self.collection.insert_one(package)
+        # Prices feed the revenue reports
+        bump_data_version()
         return {"success": True, "package_id": str(result.inserted_id)}
     
     def get_all_packages(self, include_inactive=False):
@@ -86,6 +89,7 @@ class Package:
                 {"_id": ObjectId(package_id)},
                 {"$set": update_data}
             )
+            bump_data_version()
             
             return {"success": True, "modified": result.modified_count}
         except Exception as e:
@@ -98,17 +102,36 @@ class Package:
                 {"_id": ObjectId(package_id)},
                 {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
             )
+            bump_data_version()
             return {"success": True, "modified": result.modified_count}
         except Exception as e:
             return {"error": str(e)}
     
     def get_package_analytics(self):
-        """Get package usage analytics"""
-        from app.models.subscription import Subscription
+        """Get agreed subscriptions and revenue per package, split by payment status"""
+        from app.models.daily_stats import DailyStats
         
-        # This would typically be injected or accessed differently
-        # For now, we'll create a separate method to be called from analytics
-        pass
+        analytics = {}
+        for row in DailyStats(self.collection.database).revenue(self.get_price_map()):
+            package = analytics.setdefault(row['package'], {
+                "package": row['package'],
+                "subscriptions": 0,
+                "revenue": {"paid": 0, "pending": 0, "failed": 0}
+            })
+            package["subscriptions"] += row['subscriptions']
+            status = (row['payment_status'] or 'pending').lower()
+            package["revenue"][status] = package["revenue"].get(status, 0) + row['revenue']
+        
+        return sorted(analytics.values(), key=lambda package: package["subscriptions"], reverse=True)
+    
+    def get_active_package_names(self):
+        """Get the names of all active packages as a set"""
+        return set(self.collection.distinct("name", {"is_active": True}))
+    
+    def get_price_map(self):
+        """Get {package name: price}, preferring active packages over retired ones with the same name"""
+        packages = self.collection.find({}, {"name": 1, "price": 1, "is_active": 1}).sort("is_active", 1)
+        return {package["name"]: float(package.get("price") or 0) for package in packages}
     
     def validate_package_exists(self, package_name):
         """Validate that a package exists and is active"""
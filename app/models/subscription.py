@@ -1,82 +1,477 @@
+import base64
+import re
+import unicodedata
 from datetime import datetime, timedelta
-from bson import ObjectId
+from bson import ObjectId, json_util
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 from .geography import get_kigali_districts, get_sectors_by_district, validate_location
+from .daily_stats import DailyStats, ROLLUP_SOURCE_FIELDS
+from app.utils.validators import normalize_phone_number, phone_number_prefix
+from app.utils.cache import bump_data_version
+from app.utils.analytics import renewal_forecast, cohort_retention
+
+# Listing order; _id breaks ties between documents created in the same millisecond
+LIST_SORT = [("created_at", -1), ("_id", -1)]
+
+# Search results: best relevance first, then newest
+SEARCH_SORT = [("score", -1), ("created_at", -1), ("_id", -1)]
+
+# Fields whose words are indexed in search_tokens
+SEARCH_SOURCE_FIELDS = ('phone_number', 'email', 'child_name', 'parent_name', 'area', 'location', 'cell')
+
+# Fields computed on write from SEARCH_SOURCE_FIELDS, never accepted from clients
+DERIVED_FIELDS = ('search_tokens', 'phone_e164')
+
+# Length of a full Rwandan E.164 number, e.g. +250781111111
+E164_LENGTH = 13
+
+# Fields clients may select with fields=, also the default projection
+SUBSCRIPTION_FIELDS = (
+    'phone_number', 'email', 'child_name', 'parent_name', 'agreed_refused',
+    'package', 'date_of_subscription', 'renew_subscription_by', 'payment_status',
+    'area', 'location', 'cell', 'created_at', 'updated_at', 'is_active'
+)
+# Fields that identify a family, never served on unauthenticated routes
+PII_FIELDS = ('phone_number', 'email', 'child_name', 'parent_name')
+PUBLIC_FIELDS = tuple(f for f in SUBSCRIPTION_FIELDS if f not in PII_FIELDS)
+
+DATE_FIELDS = ('date_of_subscription', 'renew_subscription_by')
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+# Documents per getMore round trip when streaming exports
+EXPORT_BATCH_SIZE = 1000
+
+# Subscription IDs per round trip in bulk updates
+BULK_WRITE_BATCH_SIZE = 1000
+
+# Passes over a bulk update batch before documents that keep changing
+# underneath it are reported as failed
+BULK_UPDATE_ATTEMPTS = 3
+
+# Rows per insert_many in bulk imports
+IMPORT_BATCH_SIZE = 1000
+
+# Fields every new subscription must provide
+REQUIRED_FIELDS = (
+    'phone_number', 'email', 'child_name', 'parent_name',
+    'agreed_refused', 'package', 'date_of_subscription',
+    'area', 'location'
+)
+AGREEMENT_STATUSES = ('Agreed', 'Refused')
+PAYMENT_STATUSES = ('Pending', 'Paid', 'Failed')
+
+# Type every cursor value must have, per sort key; anything else (e.g. an
+# operator document like {"$ne": null}) is rejected before reaching a query
+SORT_KEY_TYPES = {
+    'created_at': datetime,
+    '_id': ObjectId,
+    'score': int
+}
+
+# with_total modes: exact count, no count, or a cheap estimate
+TOTAL_MODES = ('true', 'false', 'estimate')
+# Filtered estimates stop counting here instead of scanning the whole match
+ESTIMATE_COUNT_LIMIT = 10000
+
+# Shorter search words match too much of the collection to be useful
+MIN_SEARCH_TERM_LENGTH = 2
+# Search ranks only the newest matches, so its cost stays bounded as data grows
+SEARCH_CANDIDATE_LIMIT = 1000
+
+def encode_cursor(values):
+    """Encode the sort key values of the last returned document as an opaque cursor"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort=LIST_SORT):
+    """Decode a cursor produced by encode_cursor, returns None if it is malformed"""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(sort):
+        return None
+    for value, (field, _) in zip(values, sort):
+        if not isinstance(value, SORT_KEY_TYPES[field]) or isinstance(value, bool):
+            return None
+    return values
+
+def parse_fields(value, allowed=SUBSCRIPTION_FIELDS):
+    """Parse a comma separated fields= value against a whitelist
+    
+    Returns (fields, None) on success, (None, message) for unknown fields.
+    An empty value selects every allowed field.
+    """
+    if not value:
+        return tuple(allowed), None
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        return None, f"Unknown fields: {unknown}. Allowed fields: {list(allowed)}"
+    return fields, None
+
+def serialize_subscription(sub):
+    """Convert ObjectId and date values of a (possibly projected) document to JSON types"""
+    sub['_id'] = str(sub['_id'])
+    for field in DATE_FIELDS:
+        if field in sub:
+            sub[field] = sub[field].strftime('%Y-%m-%d')
+    for field in TIMESTAMP_FIELDS:
+        if field in sub:
+            sub[field] = sub[field].isoformat()
+    return sub
+
+def tokenize(text):
+    """Split text into lowercase, accent-free alphanumeric tokens"""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+def search_tokens(sub):
+    """Build the indexed search_tokens of a subscription from its source fields"""
+    tokens = []
+    for field in SEARCH_SOURCE_FIELDS:
+        tokens.extend(tokenize(sub.get(field)))
+    
+    # Phone numbers are matched on their digits, whatever the formatting
+    digits = re.sub(r'\D', '', str(sub.get('phone_number') or ''))
+    if digits:
+        tokens.append(digits)
+    
+    return list(dict.fromkeys(tokens))
+
+def build_subscription(data, location_checks=None, strict=True):
+    """Validate input data and build a new subscription document
+    
+    Returns (subscription, None) or (None, error message). Pass a dict as
+    `location_checks` to reuse location validation across many rows.
+    Imports are `strict`: required fields must be non-empty and
+    payment_status must be a known status. Single creates only require the
+    fields to be present and store payment_status as given, as they always have.
+    """
+    if strict:
+        missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+    else:
+        missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        return None, f"Missing required fields: {missing}"
+    
+    if data['agreed_refused'] not in AGREEMENT_STATUSES:
+        return None, 'agreed_refused must be "Agreed" or "Refused"'
+    
+    if strict:
+        payment_status = data.get('payment_status') or 'Pending'
+        if payment_status not in PAYMENT_STATUSES:
+            return None, 'payment_status must be "Pending", "Paid" or "Failed"'
+    else:
+        payment_status = data.get('payment_status', 'Pending')
+    
+    # Validate location
+    key = (data['area'], data['location'], data.get('cell'))
+    if location_checks is None or key not in location_checks:
+        check = validate_location(*key)
+        if location_checks is not None:
+            location_checks[key] = check
+    else:
+        check = location_checks[key]
+    is_valid, message = check
+    if not is_valid:
+        return None, message
+    
+    # Calculate renewal date (30 days from subscription date)
+    try:
+        subscription_date = datetime.strptime(data['date_of_subscription'], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None, "Invalid date format. Use YYYY-MM-DD"
+    renewal_date = subscription_date + timedelta(days=30)
+    
+    now = datetime.utcnow()
+    subscription = {
+        "phone_number": data['phone_number'],
+        "email": data['email'],
+        "child_name": data['child_name'],
+        "parent_name": data['parent_name'],
+        "agreed_refused": data['agreed_refused'],  # "Agreed" or "Refused"
+        "package": data['package'],
+        "date_of_subscription": subscription_date,
+        "renew_subscription_by": renewal_date,
+        "payment_status": payment_status,  # Pending, Paid, Failed
+        "area": data['area'],  # Kigali district
+        "location": data['location'],  # Sector within district
+        "cell": data.get('cell', ''),  # Optional: specific cell within sector
+        "created_at": now,
+        "updated_at": now,
+        "is_active": True
+    }
+    subscription.update(derived_fields(subscription))
+    return subscription, None
+
+def derived_fields(sub):
+    """Compute the DERIVED_FIELDS of a subscription from its source fields"""
+    return {
+        "search_tokens": search_tokens(sub),
+        "phone_e164": normalize_phone_number(sub.get('phone_number'))
+    }
+
+def keyset_filter(values, sort=LIST_SORT):
+    """Match documents that come strictly after `values` in `sort` order"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    
+    # Bound the leading key too so the index scan starts at the cursor
+    first_field, first_direction = sort[0]
+    return {
+        first_field: {"$lte" if first_direction < 0 else "$gte": values[0]},
+        "$or": clauses
+    }
 
 class Subscription:
     def __init__(self, db):
         self.collection = db.subscriptions
+        self.daily_stats = DailyStats(db)
     
     def create_subscription(self, data):
         """Create a new subscription record"""
-        # Validate location
-        is_valid, message = validate_location(data['area'], data['location'], data.get('cell'))
-        if not is_valid:
-            return {"error": message}
-        
-        # Calculate renewal date (30 days from subscription date)
-        subscription_date = datetime.strptime(data['date_of_subscription'], '%Y-%m-%d')
-        renewal_date = subscription_date + timedelta(days=30)
-        
-        subscription = {
-            "phone_number": data['phone_number'],
-            "email": data['email'],
-            "child_name": data['child_name'],
-            "parent_name": data['parent_name'],
-            "agreed_refused": data['agreed_refused'],  # "Agreed" or "Refused"
-            "package": data['package'],
-            "date_of_subscription": subscription_date,
-            "renew_subscription_by": renewal_date,
-            "payment_status": data.get('payment_status', 'Pending'),  # Pending, Paid, Failed
-            "area": data['area'],  # Kigali district
-            "location": data['location'],  # Sector within district
-            "cell": data.get('cell', ''),  # Optional: specific cell within sector
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "is_active": True
-        }
+        subscription, error = build_subscription(data, strict=False)
+        if error:
+            return {"error": error}
         
         result = self.collection.insert_one(subscription)
+        self.daily_stats.record(after=subscription)
+        bump_data_version()
         return {"success": True, "subscription_id": str(result.inserted_id)}
     
-    def get_all_subscriptions(self, filters=None, page=1, per_page=20):
-        """Get all subscriptions with optional filters"""
-        query = filters or {}
-        skip = (page - 1) * per_page
+    def import_subscriptions(self, rows, package_names, batch_size=IMPORT_BATCH_SIZE):
+        """Validate and insert many subscriptions
         
-        subscriptions = list(self.collection.find(query)
-                           .sort("created_at", -1)
-                           .skip(skip)
-                           .limit(per_page))
+        `rows` yields (row_number, data, parse_error) tuples, e.g. from
+        app.utils.imports.read_rows, and is consumed lazily. Valid rows are
+        inserted with unordered insert_many batches; invalid ones end up in
+        the per-row error report.
+        """
+        errors = []
+        inserted = 0
+        total = 0
+        batch = []
+        location_checks = {}
         
-        # Convert ObjectId to string and format dates
-        for sub in subscriptions:
-            sub['_id'] = str(sub['_id'])
-            sub['date_of_subscription'] = sub['date_of_subscription'].strftime('%Y-%m-%d')
-            sub['renew_subscription_by'] = sub['renew_subscription_by'].strftime('%Y-%m-%d')
-            sub['created_at'] = sub['created_at'].isoformat()
-            sub['updated_at'] = sub['updated_at'].isoformat()
+        for row_number, data, parse_error in rows:
+            total += 1
+            if parse_error:
+                errors.append({"row": row_number, "error": parse_error})
+                continue
+            
+            subscription, error = build_subscription(data, location_checks)
+            if not error and subscription['package'] not in package_names:
+                error = "Invalid package name"
+            if error:
+                errors.append({"row": row_number, "error": error})
+                continue
+            
+            batch.append((row_number, subscription))
+            if len(batch) >= batch_size:
+                inserted += self._insert_batch(batch, errors)
+                batch = []
         
-        total = self.collection.count_documents(query)
+        if batch:
+            inserted += self._insert_batch(batch, errors)
+        
+        errors.sort(key=lambda item: item['row'])
+        return {
+            "total_rows": total,
+            "inserted": inserted,
+            "failed": len(errors),
+            "errors": errors
+        }
+    
+    def _insert_batch(self, batch, errors):
+        """insert_many one import batch, recording failed rows in `errors`"""
+        failed = set()
+        try:
+            self.collection.insert_many([sub for _, sub in batch], ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed.add(write_error['index'])
+                errors.append({"row": batch[write_error['index']][0], "error": write_error['errmsg']})
+        
+        inserted = [sub for index, (_, sub) in enumerate(batch) if index not in failed]
+        self.daily_stats.record_many((None, sub) for sub in inserted)
+        bump_data_version()
+        return len(inserted)
+    
+    def get_all_subscriptions(self, filters=None, page=1, per_page=20, cursor=None, with_total='estimate', fields=None):
+        """Get all subscriptions with optional filters
+        
+        Pages are addressed either by `page` (skip/limit) or by an opaque
+        `cursor` taken from a previous response's `next_cursor`. Cursor pages
+        seek straight to the last seen (created_at, _id) on the
+        (is_active, created_at, _id) index, so deep pages cost the same as
+        the first one.
+        
+        `fields` limits the returned document keys (see SUBSCRIPTION_FIELDS)
+        and is applied as a Mongo projection.
+        
+        By default ('estimate') the page comes with a cheap approximate
+        total. 'true' counts the exact total on the index, which is a second
+        round trip to Mongo, and 'false' skips counting altogether.
+        """
+        return self._paginate(filters or {}, LIST_SORT, page, per_page, cursor, with_total, fields)
+    
+    def search_subscriptions(self, q, page=1, per_page=20, cursor=None, with_total='estimate', fields=None):
+        """Search active subscriptions by name, email, phone and location
+        
+        Every word of `q` must be a prefix of one of the document's
+        search_tokens, which is an anchored range scan on the search_tokens
+        index. Words shorter than MIN_SEARCH_TERM_LENGTH are ignored. Only
+        the newest SEARCH_CANDIDATE_LIMIT matches are ranked, by how many
+        words match a token exactly and then by recency, and totals are
+        capped at that limit. Paging works like get_all_subscriptions.
+        
+        Queries that look like a phone number skip the token search and do a
+        single equality (full number) or anchored prefix lookup on the
+        normalized phone_e164 index instead, newest first.
+        """
+        phone_prefix = phone_number_prefix(q)
+        if phone_prefix:
+            if len(phone_prefix) >= E164_LENGTH:
+                phone_match = phone_prefix
+            else:
+                phone_match = {"$regex": "^" + re.escape(phone_prefix)}
+            query = {"is_active": True, "phone_e164": phone_match}
+            return self._paginate(query, LIST_SORT, page, per_page, cursor, with_total, fields)
+        
+        terms = list(dict.fromkeys(term for term in tokenize(q) if len(term) >= MIN_SEARCH_TERM_LENGTH))
+        if not terms:
+            return {"error": f"Search query must contain a word of at least {MIN_SEARCH_TERM_LENGTH} letters or digits"}
+        
+        query = {
+            "is_active": True,
+            "$and": [{"search_tokens": {"$regex": "^" + re.escape(term)}} for term in terms]
+        }
+        score = {"score": {"$size": {"$setIntersection": ["$search_tokens", terms]}}}
+        
+        return self._paginate(query, SEARCH_SORT, page, per_page, cursor, with_total, fields,
+                              computed=score, candidates=SEARCH_CANDIDATE_LIMIT)
+    
+    def _paginate(self, query, sort, page, per_page, cursor, with_total, fields, computed=None, candidates=None):
+        """Run a paginated listing, see get_all_subscriptions
+        
+        `computed` maps field names to aggregation expressions evaluated
+        before sorting (e.g. a relevance score); it forces the aggregation
+        path since find() cannot sort on computed values. `candidates`
+        limits that path to the newest N matches before they are scored,
+        and caps the total to match.
+        """
+        if with_total not in TOTAL_MODES:
+            return {"error": f"with_total must be one of: {list(TOTAL_MODES)}"}
+        
+        page_match = None
+        skip = 0
+        if cursor:
+            after = decode_cursor(cursor, sort)
+            if after is None:
+                return {"error": "Invalid cursor"}
+            page_match = keyset_filter(after, sort)
+        else:
+            skip = (page - 1) * per_page
+        
+        # Project the requested fields, plus the sort keys the cursor is built from
+        fields = fields or SUBSCRIPTION_FIELDS
+        projection = {field: 1 for field in fields}
+        projection.update({field: 1 for field, _ in sort})
+        
+        # Seek/skip to the page first and fetch one extra document to know
+        # whether another page follows; the total is counted separately
+        if computed:
+            pipeline = [{"$match": query}]
+            if candidates:
+                pipeline.append({"$sort": dict(LIST_SORT)})
+                pipeline.append({"$limit": candidates})
+            pipeline.append({"$addFields": computed})
+            if page_match:
+                pipeline.append({"$match": page_match})
+            pipeline.append({"$sort": dict(sort)})
+            if skip:
+                pipeline.append({"$skip": skip})
+            pipeline.append({"$limit": per_page + 1})
+            pipeline.append({"$project": projection})
+            subscriptions = list(self.collection.aggregate(pipeline, allowDiskUse=True))
+        else:
+            find_query = {"$and": [query, page_match]} if page_match else query
+            subscriptions = list(self.collection.find(find_query, projection)
+                               .sort(sort)
+                               .skip(skip)
+                               .limit(per_page + 1))
+        
+        total = None
+        if with_total == 'true':
+            if candidates:
+                total = self.collection.count_documents(query, limit=candidates)
+            else:
+                total = self.collection.count_documents(query)
+        elif with_total == 'estimate':
+            total = self.estimate_count(query)
+            if candidates:
+                total = min(total, candidates)
+        
+        has_more = len(subscriptions) > per_page
+        subscriptions = subscriptions[:per_page]
+        
+        next_cursor = None
+        if has_more:
+            last = subscriptions[-1]
+            next_cursor = encode_cursor([last[field] for field, _ in sort])
+        
+        # Drop sort keys that were only fetched for the cursor
+        dropped = [field for field, _ in sort if field != '_id' and field not in fields]
+        for sub in subscriptions:
+            for field in dropped:
+                sub.pop(field, None)
+            serialize_subscription(sub)
         
         return {
             "subscriptions": subscriptions,
             "total": total,
-            "page": page,
+            "total_is_estimate": with_total == 'estimate',
+            "page": None if cursor else page,
             "per_page": per_page,
-            "total_pages": (total + per_page - 1) // per_page
+            "total_pages": (total + per_page - 1) // per_page if total is not None else None,
+            "next_cursor": next_cursor
         }
     
-    def get_subscription_by_id(self, subscription_id):
+    def estimate_count(self, query):
+        """Cheap subscription count for infinite-scroll style clients
+        
+        Unfiltered listings read the collection metadata count (which also
+        includes soft-deleted rows); filtered ones stop at ESTIMATE_COUNT_LIMIT.
+        """
+        if set(query) <= {"is_active"}:
+            return self.collection.estimated_document_count()
+        return self.collection.count_documents(query, limit=ESTIMATE_COUNT_LIMIT)
+    
+    def iter_subscriptions(self, filters=None, fields=None, batch_size=EXPORT_BATCH_SIZE, serialize=True):
+        """Yield subscriptions one by one for exports
+        
+        The cursor is read in batches of `batch_size`, so memory stays flat
+        no matter how many documents match. Pass serialize=False to keep
+        ObjectId and datetime values for typed (Parquet, XLSX) writers.
+        """
+        projection = {field: 1 for field in fields or SUBSCRIPTION_FIELDS}
+        cursor = (self.collection.find(filters or {}, projection)
+                  .sort(LIST_SORT)
+                  .batch_size(batch_size))
+        for sub in cursor:
+            yield serialize_subscription(sub) if serialize else sub
+    
+    def get_subscription_by_id(self, subscription_id, fields=None):
         """Get subscription by ID"""
         try:
-            subscription = self.collection.find_one({"_id": ObjectId(subscription_id)})
+            projection = {field: 1 for field in fields or SUBSCRIPTION_FIELDS}
+            subscription = self.collection.find_one({"_id": ObjectId(subscription_id)}, projection)
             if subscription:
-                subscription['_id'] = str(subscription['_id'])
-                subscription['date_of_subscription'] = subscription['date_of_subscription'].strftime('%Y-%m-%d')
-                subscription['renew_subscription_by'] = subscription['renew_subscription_by'].strftime('%Y-%m-%d')
-                subscription['created_at'] = subscription['created_at'].isoformat()
-                subscription['updated_at'] = subscription['updated_at'].isoformat()
-                return subscription
+                return serialize_subscription(subscription)
             return None
         except:
             return None
@@ -85,14 +480,22 @@ class Subscription:
         """Update subscription record"""
         try:
             update_data = data.copy()
+            for field in DERIVED_FIELDS:
+                update_data.pop(field, None)
             
-            # Validate location if area or location is being updated
-            if 'area' in update_data or 'location' in update_data:
-                # Get current subscription to merge with update data
-                current_sub = self.get_subscription_by_id(subscription_id)
+            # Get current subscription to merge with update data
+            current_sub = None
+            if any(field in update_data for field in SEARCH_SOURCE_FIELDS):
+                current_sub = self.collection.find_one(
+                    {"_id": ObjectId(subscription_id)},
+                    {field: 1 for field in SEARCH_SOURCE_FIELDS}
+                )
                 if not current_sub:
                     return {"error": "Subscription not found"}
-                
+                update_data.update(derived_fields({**current_sub, **update_data}))
+            
+            # Validate location if area or location is being updated
+            if 'area' in update_data or 'location' in update_data:
                 area = update_data.get('area', current_sub['area'])
                 location = update_data.get('location', current_sub['location'])
                 cell = update_data.get('cell', current_sub.get('cell'))
@@ -111,104 +514,331 @@ class Subscription:
             
             update_data['updated_at'] = datetime.utcnow()
             
-            result = self.collection.update_one(
+            if not any(field in update_data for field in ROLLUP_SOURCE_FIELDS):
+                result = self.collection.update_one(
+                    {"_id": ObjectId(subscription_id)},
+                    {"$set": update_data}
+                )
+                bump_data_version()
+                return {"success": True, "modified": result.modified_count}
+            
+            # The daily rollup needs the buckets before and after the update
+            before = self.collection.find_one_and_update(
                 {"_id": ObjectId(subscription_id)},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={field: 1 for field in ROLLUP_SOURCE_FIELDS},
+                return_document=ReturnDocument.BEFORE
             )
+            if not before:
+                return {"success": True, "modified": 0}
             
-            return {"success": True, "modified": result.modified_count}
+            self.daily_stats.record(before, {**before, **update_data})
+            bump_data_version()
+            return {"success": True, "modified": 1}
         except Exception as e:
             return {"error": str(e)}
     
     def delete_subscription(self, subscription_id):
         """Soft delete subscription"""
         try:
-            result = self.collection.update_one(
-                {"_id": ObjectId(subscription_id)},
-                {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+            before = self.collection.find_one_and_update(
+                {"_id": ObjectId(subscription_id), "is_active": True},
+                {"$set": {"is_active": False, "updated_at": datetime.utcnow()}},
+                projection={field: 1 for field in ROLLUP_SOURCE_FIELDS},
+                return_document=ReturnDocument.BEFORE
             )
-            return {"success": True, "modified": result.modified_count}
+            if not before:
+                return {"success": True, "modified": 0}
+            
+            self.daily_stats.record(before=before)
+            bump_data_version()
+            return {"success": True, "modified": 1}
         except Exception as e:
             return {"error": str(e)}
     
-    def get_analytics(self):
-        """Get subscription analytics"""
-        pipeline = [
-            {"$match": {"is_active": True}},
-            {"$group": {
-                "_id": "$agreed_refused",
-                "count": {"$sum": 1}
-            }}
-        ]
+    def bulk_update_subscriptions(self, subscription_ids, data, batch_size=BULK_WRITE_BATCH_SIZE, progress=None):
+        """Apply the same update to many subscriptions
         
-        agreement_stats = list(self.collection.aggregate(pipeline))
+        The update is validated once, then sent per batch of IDs as a single
+        update_many, or as one unordered bulk_write when it touches fields
+        that derived fields or location validation depend on. Returns
+        {"results": [{"subscription_id", "result"}...]} in input order,
+        or {"error": message} when the update itself is invalid.
+        `progress(done, total)` is called after each batch when given.
+        """
+        update_data = data.copy()
+        for field in DERIVED_FIELDS + ('_id', 'created_at'):
+            update_data.pop(field, None)
         
-        # Payment status analytics
-        payment_pipeline = [
-            {"$match": {"is_active": True}},
-            {"$group": {
-                "_id": "$payment_status",
-                "count": {"$sum": 1}
-            }}
-        ]
+        if not update_data:
+            return {"error": "No fields to update"}
+        if 'agreed_refused' in update_data and update_data['agreed_refused'] not in AGREEMENT_STATUSES:
+            return {"error": 'agreed_refused must be "Agreed" or "Refused"'}
+        if 'payment_status' in update_data and update_data['payment_status'] not in PAYMENT_STATUSES:
+            return {"error": 'payment_status must be "Pending", "Paid" or "Failed"'}
         
-        payment_stats = list(self.collection.aggregate(payment_pipeline))
+        if 'date_of_subscription' in update_data:
+            try:
+                update_data['date_of_subscription'] = datetime.strptime(
+                    update_data['date_of_subscription'], '%Y-%m-%d'
+                )
+            except (TypeError, ValueError):
+                return {"error": "Invalid date format. Use YYYY-MM-DD"}
+            update_data['renew_subscription_by'] = update_data['date_of_subscription'] + timedelta(days=30)
         
-        # Package popularity
-        package_pipeline = [
-            {"$match": {"is_active": True, "agreed_refused": "Agreed"}},
-            {"$group": {
-                "_id": "$package",
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"count": -1}}
-        ]
+        update_data['updated_at'] = datetime.utcnow()
+        per_document = any(field in update_data for field in SEARCH_SOURCE_FIELDS)
+        changes_rollup = any(field in update_data for field in ROLLUP_SOURCE_FIELDS)
+        
+        # Results are keyed by ObjectId and reported against each ID as sent,
+        # so non-canonical spellings (e.g. upper-case hex) still match up
+        results = {}
+        parsed_ids = []
+        for subscription_id in subscription_ids:
+            if isinstance(subscription_id, str) and ObjectId.is_valid(subscription_id):
+                parsed_ids.append(ObjectId(subscription_id))
+            else:
+                parsed_ids.append({"error": f"'{subscription_id}' is not a valid ObjectId"})
+        object_ids = list(dict.fromkeys(item for item in parsed_ids if isinstance(item, ObjectId)))
+        
+        # Location checks only depend on (area, location, cell), validate each combination once
+        location_checks = {}
+        
+        for start in range(0, len(object_ids), batch_size):
+            batch = object_ids[start:start + batch_size]
+            if progress and start:
+                progress(start, len(object_ids))
+            
+            for _ in range(BULK_UPDATE_ATTEMPTS):
+                if not batch:
+                    break
+                batch = self._bulk_update_batch(batch, update_data, per_document, changes_rollup, location_checks, results)
+            for object_id in batch:
+                results[object_id] = {"error": "Subscription changed during the update, please retry"}
+        
+        if progress:
+            progress(len(object_ids), len(object_ids))
+        bump_data_version()
+        return {"results": [
+            {
+                "subscription_id": subscription_id,
+                "result": item if isinstance(item, dict) else results.get(item, {"error": "Subscription not found"})
+            }
+            for subscription_id, item in zip(subscription_ids, parsed_ids)
+        ]}
+    
+    def _bulk_update_batch(self, object_ids, update_data, per_document, changes_rollup, location_checks, results):
+        """Update one batch for bulk_update_subscriptions; returns the IDs to retry
+        
+        Each write only applies while the fields it depends on still hold the
+        values read here, and the rollup is moved only for documents that
+        were actually written (found by their new updated_at), so a
+        concurrent update cannot make the rollup or derived fields drift.
+        Documents that already hold the new values are left untouched and
+        reported with modified 0.
+        """
+        watched = set()
+        if changes_rollup:
+            watched.update(ROLLUP_SOURCE_FIELDS)
+        if per_document:
+            watched.update(SEARCH_SOURCE_FIELDS)
+        new_values = {field: value for field, value in update_data.items() if field != 'updated_at'}
+        projection = {field: 1 for field in watched | set(new_values)}
+        written_changes = {}
+        
+        current_subs = []
+        for current_sub in self.collection.find({"_id": {"$in": object_ids}}, projection):
+            if all(current_sub.get(field) == value for field, value in new_values.items()):
+                results[current_sub['_id']] = {"success": True, "modified": 0}
+            else:
+                current_subs.append(current_sub)
+        
+        if per_document:
+            operations = []
+            for current_sub in current_subs:
+                merged = {**current_sub, **update_data}
+                
+                if 'area' in update_data or 'location' in update_data:
+                    key = (merged.get('area'), merged.get('location'), merged.get('cell'))
+                    if key not in location_checks:
+                        location_checks[key] = validate_location(*key)
+                    is_valid, message = location_checks[key]
+                    if not is_valid:
+                        results[current_sub['_id']] = {"error": message}
+                        continue
+                
+                condition = {field: current_sub.get(field) for field in watched}
+                operations.append(UpdateOne(
+                    {"_id": current_sub['_id'], **condition},
+                    {"$set": {**update_data, **derived_fields(merged)}}
+                ))
+                written_changes[current_sub['_id']] = (current_sub, merged)
+            
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+        else:
+            # Documents with the same watched values share one update_many
+            groups = {}
+            for current_sub in current_subs:
+                condition = tuple((field, current_sub.get(field)) for field in sorted(watched))
+                groups.setdefault(condition, []).append(current_sub['_id'])
+                written_changes[current_sub['_id']] = (current_sub, {**current_sub, **update_data})
+            for condition, ids in groups.items():
+                self.collection.update_many({"_id": {"$in": ids}, **dict(condition)}, {"$set": update_data})
+        
+        if not written_changes:
+            return []
+        written = {sub['_id'] for sub in self.collection.find(
+            {"_id": {"$in": list(written_changes)}, "updated_at": update_data['updated_at']}, {"_id": 1}
+        )}
+        if changes_rollup:
+            self.daily_stats.record_many(
+                change for object_id, change in written_changes.items() if object_id in written
+            )
+        for object_id in written:
+            results[object_id] = {"success": True, "modified": 1}
+        return [object_id for object_id in written_changes if object_id not in written]
+    
+    def backfill_derived_fields(self, batch_size=EXPORT_BATCH_SIZE):
+        """Recompute DERIVED_FIELDS for every subscription
+        
+        Used after adding or changing a derived field. Writes go out as
+        unordered bulk_write batches; returns the number of modified documents.
+        """
+        modified = 0
+        operations = []
+        cursor = self.collection.find({}, {field: 1 for field in SEARCH_SOURCE_FIELDS}).batch_size(batch_size)
+        for sub in cursor:
+            operations.append(UpdateOne({"_id": sub["_id"]}, {"$set": derived_fields(sub)}))
+            if len(operations) >= batch_size:
+                modified += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
         
-        package_stats = list(self.collection.aggregate(package_pipeline))
+        if operations:
+            modified += self.collection.bulk_write(operations, ordered=False).modified_count
+        return modified
+    
+    def get_analytics(self):
+        """Get subscription analytics
+        
+        Every breakdown is a $facet branch over the same $match, so the
+        active set is scanned once instead of once per breakdown.
+        """
+        def count_by(field):
+            return [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
         
-        # Area distribution
-        area_pipeline = [
+        renewal_cutoff = datetime.utcnow() + timedelta(days=7)
+        pipeline = [
             {"$match": {"is_active": True}},
-            {"$group": {
-                "_id": "$area",
-                "count": {"$sum": 1}
+            {"$project": {
+                "_id": 0,
+                "agreed_refused": 1,
+                "payment_status": 1,
+                "package": 1,
+                "area": 1,
+                "date_of_subscription": 1,
+                "renew_subscription_by": 1
             }},
-            {"$sort": {"count": -1}}
+            {"$facet": {
+                "agreement": count_by("agreed_refused"),
+                "payment": count_by("payment_status"),
+                # Package popularity
+                "packages": (
+                    [{"$match": {"agreed_refused": "Agreed"}}]
+                    + count_by("package")
+                    + [{"$sort": {"count": -1}}]
+                ),
+                # Area distribution
+                "areas": count_by("area") + [{"$sort": {"count": -1}}],
+                # Monthly subscription trends
+                "monthly": [
+                    {"$group": {
+                        "_id": {
+                            "year": {"$year": "$date_of_subscription"},
+                            "month": {"$month": "$date_of_subscription"}
+                        },
+                        "count": {"$sum": 1}
+                    }},
+                    {"$sort": {"_id.year": -1, "_id.month": -1}},
+                    {"$limit": 12}
+                ],
+                "totals": [
+                    {"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "upcoming_renewals": {"$sum": {
+                            "$cond": [{"$and": [
+                                {"$lte": ["$renew_subscription_by", renewal_cutoff]},
+                                # Missing dates sort below any date, count_documents never matched them
+                                {"$gt": ["$renew_subscription_by", None]}
+                            ]}, 1, 0]
+                        }}
+                    }}
+                ]
+            }}
         ]
         
-        area_stats = list(self.collection.aggregate(area_pipeline))
+        result = next(self.collection.aggregate(pipeline))
+        totals = result["totals"][0] if result["totals"] else {"total": 0, "upcoming_renewals": 0}
+        agreement_counts = {item["_id"]: item["count"] for item in result["agreement"]}
+        
+        return {
+            "total_subscriptions": totals["total"],
+            "total_agreed": agreement_counts.get("Agreed", 0),
+            "total_refused": agreement_counts.get("Refused", 0),
+            "agreement_breakdown": result["agreement"],
+            "payment_status": result["payment"],
+            "popular_packages": result["packages"],
+            "area_distribution": result["areas"],
+            "monthly_trends": result["monthly"],
+            "upcoming_renewals": totals["upcoming_renewals"]
+        }
+    
+    def get_dashboard_stats(self):
+        """Get the dashboard counters from a single grouped aggregation"""
+        def count_if(condition):
+            return {"$sum": {"$cond": [condition, 1, 0]}}
         
-        # Monthly subscription trends
-        monthly_pipeline = [
+        start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        renewal_cutoff = datetime.utcnow() + timedelta(days=7)
+        is_agreed = {"$eq": ["$agreed_refused", "Agreed"]}
+        
+        pipeline = [
             {"$match": {"is_active": True}},
             {"$group": {
-                "_id": {
-                    "year": {"$year": "$date_of_subscription"},
-                    "month": {"$month": "$date_of_subscription"}
-                },
-                "count": {"$sum": 1}
-            }},
-            {"$sort": {"_id.year": -1, "_id.month": -1}},
-            {"$limit": 12}
+                "_id": None,
+                "total": {"$sum": 1},
+                "agreed": count_if(is_agreed),
+                "refused": count_if({"$eq": ["$agreed_refused", "Refused"]}),
+                "this_month": count_if({"$gte": ["$date_of_subscription", start_of_month]}),
+                "upcoming_renewals": count_if({"$and": [
+                    is_agreed,
+                    {"$lte": ["$renew_subscription_by", renewal_cutoff]},
+                    # Missing dates sort below any date, count_documents never matched them
+                    {"$gt": ["$renew_subscription_by", None]}
+                ]}),
+                "paid": count_if({"$eq": ["$payment_status", "Paid"]}),
+                "pending": count_if({"$eq": ["$payment_status", "Pending"]}),
+                "failed": count_if({"$eq": ["$payment_status", "Failed"]})
+            }}
         ]
         
-        monthly_stats = list(self.collection.aggregate(monthly_pipeline))
+        counts = next(self.collection.aggregate(pipeline), None) or {}
+        total = counts.get("total", 0)
+        agreed = counts.get("agreed", 0)
         
         return {
-            "total_subscriptions": self.collection.count_documents({"is_active": True}),
-            "total_agreed": self.collection.count_documents({"is_active": True, "agreed_refused": "Agreed"}),
-            "total_refused": self.collection.count_documents({"is_active": True, "agreed_refused": "Refused"}),
-            "agreement_breakdown": agreement_stats,
-            "payment_status": payment_stats,
-            "popular_packages": package_stats,
-            "area_distribution": area_stats,
-            "monthly_trends": monthly_stats,
-            "upcoming_renewals": self.collection.count_documents({
-                "is_active": True,
-                "renew_subscription_by": {
-                    "$lte": datetime.utcnow() + timedelta(days=7)
-                }
-            })
+            "total_subscriptions": total,
+            "total_agreed": agreed,
+            "total_refused": counts.get("refused", 0),
+            "success_rate": round((agreed / total * 100), 2) if total > 0 else 0,
+            "this_month_subscriptions": counts.get("this_month", 0),
+            "upcoming_renewals": counts.get("upcoming_renewals", 0),
+            "payment_breakdown": {
+                "paid": counts.get("paid", 0),
+                "pending": counts.get("pending", 0),
+                "failed": counts.get("failed", 0)
+            }
         }
     
     def get_upcoming_renewals(self, days_ahead=7):
@@ -220,4 +850,54 @@ class Subscription:
             'agreed_refused': 'Agreed'
         }
         
-        return self.get_all_subscriptions(filters)
\ No newline at end of file
+        return self.get_all_subscriptions(filters, with_total='true')
+    
+    def get_renewal_forecast(self, start, days, prices):
+        """Per-day renewals due in [start, start + days) with the revenue at stake
+        
+        Only the three needed fields are read, through one projected cursor,
+        and the histograms are computed with pandas.
+        """
+        cursor = self.collection.find(
+            {
+                "is_active": True,
+                "agreed_refused": "Agreed",
+                "renew_subscription_by": {"$gte": start, "$lt": start + timedelta(days=days)}
+            },
+            {"_id": 0, "renew_subscription_by": 1, "area": 1, "package": 1}
+        ).batch_size(EXPORT_BATCH_SIZE)
+        
+        return renewal_forecast(cursor, start, days, prices)
+    
+    def get_cohort_retention(self, first_month, current_month, filters=None):
+        """Monthly cohort retention from `first_month` through `current_month`
+        
+        Reads all subscriptions (active or not) subscribed since `first_month`
+        through one projected cursor; see app.utils.analytics.cohort_retention.
+        """
+        query = dict(filters or {})
+        query["date_of_subscription"] = {"$gte": datetime(first_month.year, first_month.month, 1)}
+        cursor = self.collection.find(
+            query,
+            {"_id": 0, "date_of_subscription": 1, "renew_subscription_by": 1, "payment_status": 1, "is_active": 1}
+        ).batch_size(EXPORT_BATCH_SIZE)
+        
+        return cohort_retention(cursor, first_month, current_month)
+    
+    def get_geo_distribution(self):
+        """Active subscription totals and agreed counts per (area, location, cell), in one aggregation"""
+        pipeline = [
+            {"$match": {"is_active": True}},
+            {"$group": {
+                "_id": {"area": "$area", "location": "$location", "cell": "$cell"},
+                "total": {"$sum": 1},
+                "agreed": {
+                    "$sum": {"$cond": [{"$eq": ["$agreed_refused", "Agreed"]}, 1, 0]}
+                }
+            }}
+        ]
+        
+        return {
+            (item["_id"].get("area"), item["_id"].get("location"), item["_id"].get("cell")): (item["total"], item["agreed"])
+            for item in self.collection.aggregate(pipeline)
+        }
\ No newline at end of file
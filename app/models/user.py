@@ -1,6 +1,7 @@
-import bcrypt
 from datetime import datetime
 from bson import ObjectId
+from app.auth.roles import invalidate_user_role
+from app.utils.security import hash_password, check_password, needs_rehash
 
 class User:
     def __init__(self, db):
@@ -14,7 +15,7 @@ class User:
         if self.collection.find_one({"email": email}):
             return {"error": "Email already exists"}
         
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = hash_password(password)
         
         user = {
             "username": username,
@@ -31,7 +32,13 @@ class User:
     def authenticate(self, username, password):
         """Authenticate user with username and password"""
         user = self.collection.find_one({"username": username, "is_active": True})
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password']):
+        if user and check_password(password, user['password']):
+            # Upgrade the hash when the configured work factor has changed
+            if needs_rehash(user['password']):
+                self.collection.update_one(
+                    {"_id": user['_id'], "password": user['password']},
+                    {"$set": {"password": hash_password(password)}}
+                )
             return {
                 "user_id": str(user['_id']),
                 "username": user['username'],
@@ -60,10 +67,7 @@ class User:
             
             # Hash password if provided
             if 'password' in update_data:
-                update_data['password'] = bcrypt.hashpw(
-                    update_data['password'].encode('utf-8'), 
-                    bcrypt.gensalt()
-                )
+                update_data['password'] = hash_password(update_data['password'])
             
             update_data['updated_at'] = datetime.utcnow()
             
@@ -71,6 +75,8 @@ class User:
                 {"_id": ObjectId(user_id)},
                 {"$set": update_data}
             )
+            if 'role' in update_data or 'is_active' in update_data:
+                invalidate_user_role(user_id)
             
             return {"success": True, "modified": result.modified_count}
         except Exception as e:
@@ -83,6 +89,7 @@ class User:
                 {"_id": ObjectId(user_id)},
                 {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
             )
+            invalidate_user_role(user_id)
             return {"success": True, "modified": result.modified_count}
         except Exception as e:
             return {"error": str(e)}
@@ -0,0 +1,112 @@
+# Vectorized report computations over projected subscription cursors
+
+def renewal_forecast(rows, start, days, prices):
+    """Per-day renewal counts and revenue at stake, by area and package
+    
+    `rows` yields documents with renew_subscription_by, area and package;
+    `prices` maps package names to prices. Days without renewals are
+    included as zeros.
+    """
+    import pandas as pd
+    
+    frame = pd.DataFrame.from_records(rows, columns=['renew_subscription_by', 'area', 'package'])
+    frame['day'] = pd.to_datetime(frame['renew_subscription_by']).dt.normalize()
+    frame['revenue'] = frame['package'].map(prices).fillna(0.0).astype(float)
+    frame[['area', 'package']] = frame[['area', 'package']].fillna('Unknown')
+    
+    calendar = pd.date_range(start, periods=days, freq='D')
+    daily = frame.groupby('day').agg(renewals=('day', 'size'), revenue=('revenue', 'sum'))
+    daily = daily.reindex(calendar, fill_value=0)
+    by_day_area = frame.groupby(['day', 'area']).size().unstack(fill_value=0).reindex(calendar, fill_value=0)
+    by_day_package = frame.groupby(['day', 'package']).size().unstack(fill_value=0).reindex(calendar, fill_value=0)
+    
+    def totals(column):
+        grouped = frame.groupby(column).agg(renewals=('day', 'size'), revenue=('revenue', 'sum'))
+        return [
+            {column: name, 'renewals': int(row.renewals), 'revenue': round(float(row.revenue), 2)}
+            for name, row in grouped.sort_values('renewals', ascending=False).iterrows()
+        ]
+    
+    def nonzero(row):
+        return {name: int(count) for name, count in row.items() if count}
+    
+    return {
+        'from': calendar[0].strftime('%Y-%m-%d'),
+        'to': calendar[-1].strftime('%Y-%m-%d'),
+        'total_renewals': int(len(frame)),
+        'total_revenue': round(float(frame['revenue'].sum()), 2),
+        'by_area': totals('area'),
+        'by_package': totals('package'),
+        'daily': [
+            {
+                'date': day.strftime('%Y-%m-%d'),
+                'renewals': int(daily.at[day, 'renewals']),
+                'revenue': round(float(daily.at[day, 'revenue']), 2),
+                'by_area': nonzero(by_day_area.loc[day]),
+                'by_package': nonzero(by_day_package.loc[day])
+            }
+            for day in calendar
+        ]
+    }
+
+def _month_number(dates):
+    """Months since year 0 for a datetime Series, NaN where missing"""
+    return dates.dt.year * 12 + dates.dt.month - 1
+
+def cohort_retention(rows, first_month, current_month):
+    """Monthly cohort x period retention matrix
+    
+    A subscription belongs to the cohort of its date_of_subscription month
+    and counts as retained in period k (k months after that month) when it
+    is still active, paid, and its renew_subscription_by reaches into that
+    month. `first_month` and `current_month` are dates in the first and
+    last cohort months; periods after `current_month` are left out.
+    """
+    import numpy as np
+    import pandas as pd
+    
+    frame = pd.DataFrame.from_records(
+        rows, columns=['date_of_subscription', 'renew_subscription_by', 'payment_status', 'is_active']
+    )
+    subscribed = _month_number(pd.to_datetime(frame['date_of_subscription']))
+    covered = _month_number(pd.to_datetime(frame['renew_subscription_by'])) - subscribed
+    
+    first = first_month.year * 12 + first_month.month - 1
+    cohorts = current_month.year * 12 + current_month.month - first
+    
+    cohort_index = (subscribed - first).fillna(-1).to_numpy(dtype=int)
+    months_covered = covered.fillna(-1).to_numpy(dtype=int)
+    in_range = (cohort_index >= 0) & (cohort_index < cohorts)
+    retained = (
+        in_range
+        & (months_covered >= 0)
+        & (frame['is_active'] == True).to_numpy()
+        & (frame['payment_status'] == 'Paid').to_numpy()
+    )
+    
+    sizes = np.bincount(cohort_index[in_range], minlength=cohorts)
+    
+    # retained_counts[c, k]: members of cohort c covered for exactly k months
+    retained_counts = np.zeros((cohorts, cohorts), dtype=int)
+    np.add.at(retained_counts, (cohort_index[retained], np.minimum(months_covered[retained], cohorts - 1)), 1)
+    # Retained in period k means covered for k months or more
+    retained_through = retained_counts[:, ::-1].cumsum(axis=1)[:, ::-1]
+    
+    matrix = []
+    for index in range(cohorts):
+        periods = cohorts - index
+        size = int(sizes[index])
+        year, month = divmod(first + index, 12)
+        retention = [round(count / size, 4) if size else None for count in retained_through[index, :periods]]
+        matrix.append({
+            'cohort': f'{year:04d}-{month + 1:02d}',
+            'size': size,
+            'retained': [int(count) for count in retained_through[index, :periods]],
+            'retention': retention,
+            'churn': [round(1 - rate, 4) if rate is not None else None for rate in retention]
+        })
+    
+    return {
+        'periods': cohorts,
+        'cohorts': matrix
+    }
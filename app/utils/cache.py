@@ -0,0 +1,168 @@
+# Redis cache for computed report data, invalidated by subscription writes
+import json
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, has_app_context, request
+from redis.exceptions import RedisError
+
+CACHE_KEY_PREFIX = 'cache:'
+
+# Bumped by every subscription write; entries cached under an older version are stale
+DATA_VERSION_KEY = CACHE_KEY_PREFIX + 'subscriptions:version'
+
+# Hash of hit/miss totals across processes
+STATS_KEY = CACHE_KEY_PREFIX + 'stats'
+
+# How long a caller waits for another process that is already computing the value
+LOCK_WAIT_SECONDS = 5
+LOCK_POLL_SECONDS = 0.05
+
+# Hit/miss counts are kept in process and added to STATS_KEY every this many lookups
+STATS_FLUSH_EVERY = 50
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+def _redis():
+    return current_app.config['SESSION_REDIS']
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+def bump_data_version():
+    """Invalidate every cached report after subscriptions change
+    
+    Outside an application context, or when Redis is unavailable, this is a
+    no-op and cached entries expire through their TTL instead.
+    """
+    if not has_app_context():
+        return
+    try:
+        _redis().incr(DATA_VERSION_KEY)
+    except RedisError:
+        pass
+
+def _count(outcome):
+    """Count a hit or miss, flushing the in-process counts to Redis now and then"""
+    with _stats_lock:
+        _stats[outcome] += 1
+        if sum(_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        pending = dict(_stats)
+        _stats.clear()
+    
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for field, amount in pending.items():
+            pipe.hincrby(STATS_KEY, field, amount)
+        pipe.execute()
+    except RedisError:
+        pass
+
+def cache_stats():
+    """Cache hit/miss totals, including counts this process has not flushed yet"""
+    try:
+        totals = {_decode(k): int(v) for k, v in _redis().hgetall(STATS_KEY).items()}
+    except RedisError:
+        totals = {}
+    with _stats_lock:
+        for field, amount in _stats.items():
+            totals[field] = totals.get(field, 0) + amount
+    
+    hits, misses = totals.get('hits', 0), totals.get('misses', 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0
+    }
+
+def cached(key, ttl, compute, versioned=True):
+    """Return the cached JSON value for `key`, computing and storing it on a miss
+    
+    Entries are tagged with the subscriptions data version, so a hit costs
+    one MGET of the version and the entry, and any write makes every entry
+    stale. `ttl` bounds how long values that depend on the current time are
+    served. Only one process recomputes a missing entry; concurrent callers
+    wait for its result. If Redis is unavailable the value is computed
+    directly. A `compute` result of None is returned but not cached.
+    With versioned=False entries are kept for their whole TTL regardless
+    of writes.
+    """
+    if not ttl:
+        return compute()
+    
+    redis_client = _redis()
+    cache_key = CACHE_KEY_PREFIX + key
+    lock_key = cache_key + ':lock'
+    
+    def lookup():
+        version, entry = redis_client.mget(DATA_VERSION_KEY, cache_key)
+        version = _decode(version) or '0'
+        if entry is not None:
+            entry_version, _, value = _decode(entry).partition('\n')
+            if entry_version == version or not versioned:
+                return version, json.loads(value)
+        return version, None
+    
+    try:
+        version, value = lookup()
+        if value is not None:
+            _count('hits')
+            return value
+        
+        if not redis_client.set(lock_key, 1, nx=True, ex=LOCK_WAIT_SECONDS):
+            deadline = time.monotonic() + LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                version, value = lookup()
+                if value is not None:
+                    _count('hits')
+                    return value
+                # The holder finished without leaving a current entry (a write
+                # bumped the version, or there was nothing to cache): stop
+                # waiting and compute, unless another caller took over the lock
+                if not redis_client.exists(lock_key):
+                    if redis_client.set(lock_key, 1, nx=True, ex=LOCK_WAIT_SECONDS):
+                        break
+    except RedisError:
+        return compute()
+    
+    _count('misses')
+    result = compute()
+    try:
+        if result is not None:
+            # Tag with the version read before computing, so a write that
+            # lands meanwhile leaves this entry stale instead of hiding it
+            redis_client.set(cache_key, f'{version}\n{json.dumps(result)}', ex=ttl)
+        redis_client.delete(lock_key)
+    except RedisError:
+        pass
+    return result
+
+def cached_response(ttl_setting='REPORT_CACHE_SECONDS'):
+    """Cache a JSON view's successful responses per path and query string
+    
+    The TTL is read from the `ttl_setting` config key. Responses are shared
+    between users, so only use this on views whose output does not depend
+    on who is asking.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = None
+            
+            def compute():
+                nonlocal response
+                response = current_app.make_response(view(*args, **kwargs))
+                return response.get_data(as_text=True) if response.status_code == 200 else None
+            
+            query = urlencode(sorted(request.args.items(multi=True)))
+            body = cached(f'response:{request.path}?{query}', current_app.config.get(ttl_setting, 0), compute)
+            if response is not None:
+                return response
+            return current_app.response_class(body, mimetype='application/json')
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+# Redis pub/sub fan-out of subscription changes to live (SSE) clients
+import json
+import queue
+import threading
+import time
+from flask import current_app, has_app_context
+from redis.exceptions import RedisError
+
+EVENTS_CHANNEL = 'events:subscriptions'
+
+# Events buffered per client before it is considered too slow and resynced
+LISTENER_QUEUE_SIZE = 100
+
+# Pause before resubscribing after losing the Redis connection
+RECONNECT_SECONDS = 1
+
+def publish_event(event_type, data):
+    """Publish an event to every process serving live clients
+    
+    A no-op outside an application context or when Redis is unavailable.
+    """
+    if not has_app_context():
+        return
+    try:
+        current_app.config['SESSION_REDIS'].publish(
+            EVENTS_CHANNEL,
+            json.dumps({'type': event_type, 'data': data}, default=str)
+        )
+    except RedisError:
+        pass
+
+class Listener:
+    """Events for one connected client"""
+    
+    def __init__(self):
+        self.events = queue.Queue(maxsize=LISTENER_QUEUE_SIZE)
+        # Set when events were dropped; the client should reload its snapshot
+        self.overflowed = False
+    
+    def get(self, timeout):
+        """Next raw event message, raises queue.Empty after `timeout` seconds"""
+        return self.events.get(timeout=timeout)
+    
+    def clear(self):
+        """Drop queued events, e.g. because a fresh snapshot already includes them"""
+        self.overflowed = False
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+class EventHub:
+    """One Redis subscription per process, fanned out to every local listener
+    
+    The subscriber runs on a daemon thread, which is a green thread under
+    the eventlet worker, so connected clients cost a queue each rather than
+    a Redis connection each.
+    """
+    
+    def __init__(self):
+        self.listeners = set()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def listen(self, redis_client):
+        """Register a listener, starting the subscriber thread if needed"""
+        listener = Listener()
+        with self.lock:
+            self.listeners.add(listener)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, args=(redis_client,), daemon=True)
+                self.thread.start()
+        return listener
+    
+    def unlisten(self, listener):
+        with self.lock:
+            self.listeners.discard(listener)
+    
+    def _run(self, redis_client):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._dispatch(message['data'])
+            except RedisError:
+                time.sleep(RECONNECT_SECONDS)
+    
+    def _dispatch(self, data):
+        data = data.decode('utf-8') if isinstance(data, bytes) else data
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener.events.put_nowait(data)
+            except queue.Full:
+                listener.overflowed = True
+
+hub = EventHub()
@@ -0,0 +1,192 @@
+# Streaming writers for subscription exports
+import csv
+import json
+from io import BytesIO, StringIO
+from itertools import islice
+
+# Export columns as (header, document field)
+EXPORT_COLUMNS = [
+    ('ID', '_id'),
+    ('Phone Number', 'phone_number'),
+    ('Email', 'email'),
+    ('Child Name', 'child_name'),
+    ('Parent Name', 'parent_name'),
+    ('Agreement Status', 'agreed_refused'),
+    ('Package', 'package'),
+    ('Subscription Date', 'date_of_subscription'),
+    ('Renewal Date', 'renew_subscription_by'),
+    ('Payment Status', 'payment_status'),
+    ('District', 'area'),
+    ('Sector', 'location'),
+    ('Cell', 'cell'),
+    ('Created At', 'created_at')
+]
+EXPORT_FIELDS = tuple(field for _, field in EXPORT_COLUMNS if field != '_id')
+
+# Flush streamed exports to the client in chunks of roughly this many characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Rows per Parquet row group
+PARQUET_BATCH_SIZE = 10000
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+# Formats written from raw documents (typed dates) rather than serialized ones
+RAW_FORMATS = ('parquet', 'xlsx')
+
+def generate_csv(rows):
+    """Yield CSV text in chunks while reading serialized rows"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    
+    for sub in rows:
+        writer.writerow([sub.get(field, '') for _, field in EXPORT_COLUMNS])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    
+    yield buffer.getvalue()
+
+def generate_json(rows):
+    """Yield a {"subscriptions": [...], "total": n} document in chunks"""
+    chunk = ['{"subscriptions": [']
+    size = 0
+    total = 0
+    for sub in rows:
+        item = json.dumps(sub)
+        chunk.append(item if total == 0 else ',' + item)
+        size += len(item)
+        total += 1
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    
+    chunk.append(f'], "total": {total}}}')
+    yield ''.join(chunk)
+
+def generate_ndjson(rows):
+    """Yield one JSON document per line, in chunks"""
+    chunk = []
+    size = 0
+    for sub in rows:
+        line = json.dumps(sub) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    
+    yield ''.join(chunk)
+
+class _DrainableSink:
+    """Write-only file object whose contents can be taken out between writes"""
+    
+    def __init__(self):
+        self.buffer = BytesIO()
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate(0)
+        return data
+
+def parquet_schema():
+    """Arrow schema for subscription exports: typed dates and dictionary-encoded categoricals"""
+    import pyarrow as pa
+    
+    categorical = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('_id', pa.string()),
+        ('phone_number', pa.string()),
+        ('email', pa.string()),
+        ('child_name', pa.string()),
+        ('parent_name', pa.string()),
+        ('agreed_refused', categorical),
+        ('package', categorical),
+        ('date_of_subscription', pa.date32()),
+        ('renew_subscription_by', pa.date32()),
+        ('payment_status', categorical),
+        ('area', categorical),
+        ('location', pa.string()),
+        ('cell', pa.string()),
+        ('created_at', pa.timestamp('ms'))
+    ])
+
+def generate_parquet(rows):
+    """Yield a Parquet file, one row group per PARQUET_BATCH_SIZE raw documents
+    
+    Parquet only needs to seek back for its footer, which is written last, so
+    each row group can be sent to the client as soon as it is encoded.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = parquet_schema()
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        while True:
+            batch = list(islice(rows, PARQUET_BATCH_SIZE))
+            if not batch:
+                break
+            for sub in batch:
+                sub['_id'] = str(sub['_id'])
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def write_xlsx(rows, fileobj):
+    """Write raw documents to an XLSX workbook using openpyxl's write-only mode
+    
+    Write-only worksheets spool rows to disk as they are appended, so the
+    sheet is never held in memory. The zip container needs the finished
+    sheet, hence this writes to `fileobj` instead of yielding.
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Subscriptions')
+    sheet.append([header for header, _ in EXPORT_COLUMNS])
+    
+    for sub in rows:
+        sub['_id'] = str(sub['_id'])
+        sheet.append([sub.get(field, '') for _, field in EXPORT_COLUMNS])
+    
+    workbook.save(fileobj)
+
+# format -> generator yielding the export in chunks (xlsx uses write_xlsx)
+STREAM_GENERATORS = {
+    'csv': generate_csv,
+    'json': generate_json,
+    'ndjson': generate_ndjson,
+    'parquet': generate_parquet
+}
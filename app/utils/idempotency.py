@@ -0,0 +1,104 @@
+# Idempotent POST handling: retried or double-submitted requests replay the first response
+import hashlib
+import json
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from redis.exceptions import RedisError
+
+IDEMPOTENCY_KEY_PREFIX = 'idempotency:'
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Marker stored while the first request is still running. It expires on its
+# own so a worker that dies mid-request does not block the key for good.
+PENDING = 'pending'
+PENDING_SECONDS = 60
+
+def _redis():
+    return current_app.config['SESSION_REDIS']
+
+def request_fingerprint():
+    """SHA-256 of the JSON body with keys sorted, so key order does not matter"""
+    data = request.get_json(silent=True)
+    if data is None:
+        payload = request.get_data()
+    else:
+        payload = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+def _scope():
+    """Keys are per route and, on authenticated routes, per user"""
+    try:
+        user_id = get_jwt_identity()
+    except RuntimeError:
+        user_id = None
+    return f'{request.endpoint}:{user_id}' if user_id else request.endpoint
+
+def _replay(record):
+    response = current_app.response_class(record['body'], status=record['status_code'], mimetype=record['mimetype'])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key
+    
+    Requests without the header are keyed on a hash of their JSON body for
+    IDEMPOTENCY_CONTENT_SECONDS, so a double-tapped submit is created once;
+    only their successful responses are kept. Keyed responses are kept for
+    IDEMPOTENCY_KEY_SECONDS. Server errors are never stored, so the request
+    can be retried. Place below jwt_required so keys are scoped to the user.
+    If Redis is unavailable requests run as usual.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        fingerprint = request_fingerprint()
+        key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'message': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+        if key:
+            redis_key = f'{IDEMPOTENCY_KEY_PREFIX}{_scope()}:key:{key}'
+            ttl = current_app.config['IDEMPOTENCY_KEY_SECONDS']
+        else:
+            redis_key = f'{IDEMPOTENCY_KEY_PREFIX}{_scope()}:body:{fingerprint}'
+            ttl = current_app.config['IDEMPOTENCY_CONTENT_SECONDS']
+        
+        redis_client = _redis()
+        pending = json.dumps({'status': PENDING, 'fingerprint': fingerprint})
+        try:
+            claimed = redis_client.set(redis_key, pending, nx=True, ex=PENDING_SECONDS)
+            record = None if claimed else redis_client.get(redis_key)
+        except RedisError:
+            return view(*args, **kwargs)
+        
+        if record is not None:
+            record = json.loads(record)
+            if record['fingerprint'] != fingerprint:
+                return jsonify({'message': f'{IDEMPOTENCY_HEADER} was already used with a different request body'}), 422
+            if record.get('status') == PENDING:
+                return jsonify({'message': 'The original request is still being processed'}), 409
+            return _replay(record)
+        if not claimed:
+            # The entry expired between SET and GET; run the request unguarded
+            return view(*args, **kwargs)
+        
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            redis_client.delete(redis_key)
+            raise
+        
+        try:
+            if response.status_code >= 500 or (not key and response.status_code >= 300):
+                redis_client.delete(redis_key)
+            else:
+                redis_client.set(redis_key, json.dumps({
+                    'status_code': response.status_code,
+                    'body': response.get_data(as_text=True),
+                    'mimetype': response.mimetype,
+                    'fingerprint': fingerprint
+                }), ex=ttl)
+        except RedisError:
+            pass
+        return response
+    return wrapper
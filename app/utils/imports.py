@@ -0,0 +1,124 @@
+# Streaming readers for subscription imports
+import codecs
+import csv
+import json
+import os
+import zipfile
+import zlib
+from datetime import date, datetime
+
+from app.utils.export import EXPORT_COLUMNS
+
+IMPORT_FORMATS = ('csv', 'ndjson', 'xlsx')
+
+# Content types accepted for raw (non multipart) uploads
+IMPORT_MIMETYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'xlsx'
+}
+
+# Errors raised by the readers when the file itself is corrupt
+READ_ERRORS = (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, zlib.error)
+
+# Column headers are matched on field names and on the export headers, so
+# an export can be edited and imported back
+HEADER_ALIASES = {header.lower(): field for header, field in EXPORT_COLUMNS}
+HEADER_ALIASES.update({field: field for _, field in EXPORT_COLUMNS})
+
+def detect_import_format(filename, mimetype):
+    """Guess the upload format from its file extension or content type"""
+    extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    if extension == 'jsonl':
+        extension = 'ndjson'
+    if extension in IMPORT_FORMATS:
+        return extension
+    return IMPORT_MIMETYPES.get(mimetype)
+
+def read_rows(stream, import_format):
+    """Yield (row_number, data, parse_error) for each row of an upload
+    
+    Rows are read lazily so an upload is never fully held in memory.
+    Row numbers are 1-based and count data rows only. If the file turns
+    out to be corrupt after some rows were read, the rows so far are kept
+    and a final error row reports where reading stopped; a file that
+    cannot be read at all raises.
+    """
+    readers = {
+        'csv': read_csv,
+        'ndjson': read_ndjson,
+        'xlsx': read_xlsx
+    }
+    return _stop_at_read_error(readers[import_format](stream))
+
+def _stop_at_read_error(rows):
+    row_number = 0
+    try:
+        for row in rows:
+            row_number = row[0]
+            yield row
+    except READ_ERRORS as e:
+        if not row_number:
+            raise
+        yield row_number + 1, None, f"Could not read the rest of the file: {e}"
+
+def _clean_row(row):
+    """Map headers to field names and turn cell values into plain strings"""
+    data = {}
+    for header, value in row.items():
+        field = HEADER_ALIASES.get(str(header or '').strip().lower())
+        if not field or value is None:
+            continue
+        if isinstance(value, (datetime, date)):
+            value = value.strftime('%Y-%m-%d')
+        elif isinstance(value, float) and value.is_integer():
+            value = str(int(value))
+        value = str(value).strip()
+        if value:
+            data[field] = value
+    return data
+
+def read_csv(stream):
+    """Read a binary CSV stream line by line (UTF-8, optional BOM)"""
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+    for row_number, row in enumerate(reader, start=1):
+        yield row_number, _clean_row(row), None
+
+def read_ndjson(stream):
+    """Read a binary stream with one JSON object per line, skipping blank lines"""
+    row_number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield row_number, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Each line must be a JSON object"
+            continue
+        yield row_number, _clean_row(row), None
+
+def read_xlsx(fileobj):
+    """Read the first worksheet of an XLSX file in openpyxl read-only mode
+    
+    XLSX is a zip archive, so `fileobj` must be seekable.
+    """
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, None) or ()
+        row_number = 0
+        for values in rows:
+            if not any(value not in (None, '') for value in values):
+                continue
+            row_number += 1
+            yield row_number, _clean_row(dict(zip(headers, values))), None
+    finally:
+        workbook.close()
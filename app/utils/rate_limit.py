@@ -0,0 +1,171 @@
+# Redis token-bucket rate limiting for unauthenticated endpoints
+import math
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from redis.exceptions import RedisError
+from werkzeug.exceptions import TooManyRequests
+
+RATE_LIMIT_KEY_PREFIX = 'ratelimit:'
+
+RATE_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Takes one token from every bucket in KEYS, or from none of them.
+# ARGV is (capacity, refill per ms) for each key, in order. Each bucket is a
+# hash of its token count and last refill time in ms, read from the Redis
+# clock so every app process agrees on it.
+# Returns {allowed, ms until a token is free, tokens left in each bucket}.
+# Levels are returned as strings since Redis truncates Lua numbers to integers.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    level = math.min(capacity, level + math.max(0, now - ts) * rate)
+    tokens[i] = level
+    if level < 1 then
+        wait = math.max(wait, math.ceil((1 - level) / rate))
+    end
+end
+local allowed = 0
+if wait == 0 then
+    allowed = 1
+end
+local result = {allowed, wait}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local level = tokens[i] - allowed
+    redis.call('HSET', key, 'tokens', tostring(level), 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil((capacity - level) / rate) + 1000)
+    result[i + 2] = tostring(level)
+end
+return result
+"""
+
+# Once this many local buckets are tracked, the ones that have refilled are dropped
+LOCAL_BUCKET_LIMIT = 10000
+
+def parse_rate(value):
+    """Parse a "<count>/<second|minute|hour|day>" budget into (capacity, tokens per second)"""
+    count, _, period = str(value).partition('/')
+    seconds = RATE_PERIODS.get(period.strip().lower())
+    if not seconds or not count.strip().isdigit() or int(count) < 1:
+        raise ValueError(f'Invalid rate limit: {value!r}')
+    return int(count), int(count) / seconds
+
+class _LocalBuckets:
+    """In-process copy of the buckets, used to reject floods without Redis
+    
+    A local bucket only sees this process's share of the traffic, so it
+    always holds at least as many tokens as the shared bucket in Redis. When
+    it is empty the Redis bucket is too and the request can be refused here.
+    After every Redis call the local levels are lowered to the shared ones.
+    """
+    
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+    
+    def _level(self, key, capacity, rate, now):
+        level, updated = self.buckets.get(key, (capacity, now))[:2]
+        return min(capacity, level + (now - updated) * rate)
+    
+    def wait_time(self, budgets):
+        """Seconds until every bucket has a token, 0 if the request may go to Redis"""
+        now = time.monotonic()
+        wait = 0
+        with self.lock:
+            for key, (capacity, rate) in budgets.items():
+                level = self._level(key, capacity, rate, now)
+                if level < 1:
+                    wait = max(wait, (1 - level) / rate)
+        return wait
+    
+    def sync(self, budgets, levels):
+        """Lower the local buckets to the tokens left in Redis"""
+        now = time.monotonic()
+        with self.lock:
+            if len(self.buckets) >= LOCAL_BUCKET_LIMIT:
+                self._prune(now)
+            for (key, (capacity, rate)), shared in zip(budgets.items(), levels):
+                level = min(self._level(key, capacity, rate, now), float(shared))
+                self.buckets[key] = (level, now, capacity, rate)
+    
+    def _prune(self, now):
+        """Forget buckets that have refilled; a missing bucket counts as full"""
+        for key, (level, updated, capacity, rate) in list(self.buckets.items()):
+            if level + (now - updated) * rate >= capacity:
+                del self.buckets[key]
+
+_local_buckets = _LocalBuckets()
+_scripts = {}
+
+def _token_bucket(redis_client):
+    """Registered token bucket script for a Redis client (loaded by SHA after the first call)"""
+    script = _scripts.get(id(redis_client))
+    if script is None:
+        script = _scripts[id(redis_client)] = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+    return script
+
+def client_ip():
+    """Address of the caller; run the app behind ProxyFix when it sits behind a proxy"""
+    return request.remote_addr or 'unknown'
+
+def _budgets(per_ip, per_route):
+    """Bucket key -> (capacity, tokens per second) for the current request"""
+    budgets = {}
+    route_key = RATE_LIMIT_KEY_PREFIX + (request.endpoint or request.path)
+    if per_ip:
+        budgets[f'{route_key}:ip:{client_ip()}'] = parse_rate(current_app.config[per_ip])
+    if per_route:
+        budgets[route_key] = parse_rate(current_app.config[per_route])
+    return budgets
+
+def check_rate_limit(budgets):
+    """Take a token from every bucket; return (allowed, seconds to wait)
+    
+    Costs at most one Redis round trip. If Redis is unavailable the request
+    is allowed, so an outage does not take the public endpoints down with it.
+    """
+    wait = _local_buckets.wait_time(budgets)
+    if wait:
+        return False, wait
+    
+    redis_client = current_app.config['SESSION_REDIS']
+    args = []
+    for capacity, rate in budgets.values():
+        args.extend([capacity, rate / 1000])
+    try:
+        allowed, wait_ms, *levels = _token_bucket(redis_client)(keys=list(budgets), args=args)
+    except RedisError:
+        return True, 0
+    
+    _local_buckets.sync(budgets, levels)
+    return bool(allowed), int(wait_ms) / 1000
+
+def rate_limit(per_ip=None, per_route=None):
+    """Limit a route with token buckets per client IP and for the route as a whole
+    
+    `per_ip` and `per_route` name config settings holding a budget such as
+    "10/minute". Refused requests get a 429 with a Retry-After header.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+                return view(*args, **kwargs)
+            
+            allowed, wait = check_rate_limit(_budgets(per_ip, per_route))
+            if not allowed:
+                raise TooManyRequests(retry_after=max(1, math.ceil(wait)))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
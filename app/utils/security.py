@@ -1 +1,51 @@
 # Security utility functions (e.g., password hashing, token validation)
+import os
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app, has_app_context
+
+DEFAULT_BCRYPT_ROUNDS = 12
+
+# Native threads available for hashing outside eventlet
+_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix='bcrypt')
+
+def _run_native(func, *args):
+    """Run a CPU-bound call on a native OS thread
+    
+    bcrypt releases the GIL, but under eventlet's monkey patching an inline
+    call still blocks every greenlet in the worker. tpool.execute runs it
+    on eventlet's native thread pool and lets other greenlets run meanwhile.
+    """
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(func, *args)
+    except ImportError:
+        pass
+    return _executor.submit(func, *args).result()
+
+def bcrypt_rounds():
+    """Configured bcrypt work factor"""
+    if has_app_context():
+        return current_app.config.get('BCRYPT_ROUNDS', DEFAULT_BCRYPT_ROUNDS)
+    return DEFAULT_BCRYPT_ROUNDS
+
+def hash_password(password):
+    """Hash a password with the configured work factor"""
+    salt = bcrypt.gensalt(rounds=bcrypt_rounds())
+    return _run_native(bcrypt.hashpw, password.encode('utf-8'), salt)
+
+def check_password(password, hashed):
+    """Check a password against a bcrypt hash"""
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    return _run_native(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+def needs_rehash(hashed):
+    """Whether a bcrypt hash was made with a different work factor than configured"""
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    try:
+        return int(hashed.split(b'$')[2]) != bcrypt_rounds()
+    except (IndexError, ValueError):
+        return True
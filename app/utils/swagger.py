@@ -402,7 +402,11 @@ def init_swagger(app: Flask):
                 "properties": {
                     "total": {
                         "type": "integer",
-                        "description": "Total number of items"
+                        "description": "Total number of items, null when with_total=false"
+                    },
+                    "total_is_estimate": {
+                        "type": "boolean",
+                        "description": "True when total is an estimate (with_total=estimate)"
                     },
                     "page": {
                         "type": "integer",
@@ -415,6 +419,10 @@ def init_swagger(app: Flask):
                     "total_pages": {
                         "type": "integer",
                         "description": "Total number of pages"
+                    },
+                    "next_cursor": {
+                        "type": "string",
+                        "description": "Cursor for the next page, null on the last page"
                     }
                 }
             }
@@ -1 +1,52 @@
 # Data validation utility functions
+import re
+
+RWANDA_COUNTRY_CODE = '250'
+
+# Queries made only of digits and phone punctuation, at least 4 characters long
+PHONE_QUERY = re.compile(r'^\+?[0-9][0-9\s\-().]{3,}$')
+
+def normalize_phone_number(value):
+    """Normalize a phone number to E.164, returns None if it cannot be
+    
+    National Rwandan formats (0781111111, 781111111, 250781111111) get the
+    +250 country code; numbers written with + or 00 keep their own.
+    """
+    if not value:
+        return None
+    
+    raw = str(value).strip()
+    digits = re.sub(r'\D', '', raw)
+    
+    if raw.startswith('+') or raw.startswith('00'):
+        if raw.startswith('00'):
+            digits = digits[2:]
+        return '+' + digits if 8 <= len(digits) <= 15 else None
+    
+    if len(digits) == 10 and digits.startswith('0'):
+        return '+' + RWANDA_COUNTRY_CODE + digits[1:]
+    if len(digits) == 9:
+        return '+' + RWANDA_COUNTRY_CODE + digits
+    if len(digits) == 12 and digits.startswith(RWANDA_COUNTRY_CODE):
+        return '+' + digits
+    
+    return None
+
+def phone_number_prefix(value):
+    """E.164 prefix of a (possibly partial) phone number typed in a search box
+    
+    Returns None when the value does not look like a phone number.
+    """
+    raw = (value or '').strip()
+    if not PHONE_QUERY.match(raw):
+        return None
+    
+    digits = re.sub(r'\D', '', raw)
+    if raw.startswith('+') or digits.startswith(RWANDA_COUNTRY_CODE):
+        return '+' + digits
+    if digits.startswith('0'):
+        return '+' + RWANDA_COUNTRY_CODE + digits[1:]
+    if digits.startswith('7'):
+        return '+' + RWANDA_COUNTRY_CODE + digits
+    
+    return None
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Recompute derived subscription fields (search tokens, E.164 phone numbers)
+for existing records.
+Run after deploying a change to how derived fields are built.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import Subscription
+from app.config import config
+
+def backfill_subscriptions(batch_size):
+    """Recompute derived fields on every subscription"""
+    print("🔄 Backfilling derived subscription fields...")
+    
+    app = create_app(config[os.environ.get('FLASK_ENV', 'development')])
+    
+    with app.app_context():
+        subscription_model = Subscription(app.db.db)
+        modified = subscription_model.backfill_derived_fields(batch_size=batch_size)
+    
+    print(f"✅ Updated {modified} subscriptions")
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Backfill derived subscription fields')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                       help='Documents per bulk write')
+    
+    args = parser.parse_args()
+    backfill_subscriptions(args.batch_size)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Rebuild the subscription_daily_stats rollup from the subscriptions collection.
+Run once after deploying the rollup, and whenever it may have drifted
+(e.g. after writing to subscriptions outside the application).
+
+Stop the application (or anything else writing subscriptions) first. The
+rebuild replaces the whole rollup, so subscriptions created, updated or
+deleted while it runs are missing from the result.
+"""
+
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import DailyStats
+from app.config import config
+
+def rebuild_daily_stats():
+    """Recompute every daily rollup bucket"""
+    print("⚠️  Subscription writes must be stopped while the rollup is rebuilt")
+    print("🔄 Rebuilding daily subscription stats...")
+    
+    app = create_app(config[os.environ.get('FLASK_ENV', 'development')])
+    
+    with app.app_context():
+        buckets = DailyStats(app.db.db).rebuild()
+    
+    print(f"✅ Rebuilt {buckets} daily stat buckets")
+
+if __name__ == "__main__":
+    rebuild_daily_stats()
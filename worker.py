@@ -0,0 +1,15 @@
+import os
+from app import create_app
+from app.config import config
+from app.jobs import JobWorker
+
+def main():
+    """Background job worker entry point"""
+    config_name = os.environ.get('FLASK_ENV', 'development')
+    app = create_app(config[config_name])
+    
+    print(f"⚙️  Starting job worker in {config_name} mode")
+    JobWorker(app).run()
+
+if __name__ == '__main__':
+    main()